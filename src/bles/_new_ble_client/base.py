@@ -1,7 +1,6 @@
 import json
 import random
 import threading
-import time
 from dataclasses import asdict
 from abc import ABC
 from pathlib import Path
@@ -9,6 +8,7 @@ from pathlib import Path
 from bleak import BleakClient
 
 from bles.common.loadable import Loadable
+from bles.common.timer import Time
 
 
 class BaseData(ABC):
@@ -39,7 +39,8 @@ class DebugDataList:
         data = []
         headers = None
         with open(file) as fd:
-            for i, line in fd.readlines():
+            for i, line in enumerate(fd):
+                line = line.rstrip("\n")
                 if not i: headers = line.split(csv_sep)
                 elif line:
                     content = line.split(csv_sep)
@@ -64,7 +65,7 @@ class DebugDataList:
     def __iter__(self):
         while True:
             for x in self.data:
-                time.sleep(self.interval)
+                Time.sleep(self.interval)
                 yield self._cast(x)
 
             if not self.loop: break
@@ -100,7 +101,7 @@ class BaseBleClient(ABC, Loadable):
         self._thread = None
 
     def set_data(self, _do_notify=True, **kwargs):
-        kwargs["timestamp"] = time.time()
+        kwargs["timestamp"] = Time.time()
         if self.data is None:
             self.data = self._data_class_(**kwargs)
         else:
@@ -113,7 +114,7 @@ class BaseBleClient(ABC, Loadable):
     def _run(self):
         if self._debug is not None:
             while not self._stopped.is_set():
-                time.sleep( random.randint(990, 1010)/1000)
+                Time.sleep( random.randint(990, 1010)/1000)
 
     def _notify(self):
         for handler in self._handlers:
@@ -152,8 +152,7 @@ class ServerInterface(HttpBaseServer):
             return ctrl.get_prop(name)
 
     def _on_data(self, feature, data):
-        with self.sequencer.data_lock:
-            self.queue.put(dict(data))
+        self.queue.put(data)
 
 
     @Get("/queued_data")
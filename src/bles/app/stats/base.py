@@ -1,11 +1,11 @@
 import datetime
-import time
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, is_dataclass, asdict
 from pathlib import Path
 
 import pandas as pd
 
 from bles.common.config import config
+from bles.common.timer import Time
 
 DEFAULT_HR = {
     "bpm" : 0
@@ -32,13 +32,22 @@ class Point:
 
     @classmethod
     def new(cls, data):
-        cy = data.get("cycling", DEFAULT_CYLCING)
-        hr = data.get("heart_rate", DEFAULT_HR)
-        tmp = dict(cy)
-        tmp.update(hr)
-        tmp["timestamp"] = time.time()
+        if "index" in data:
+            # point rééchantillonné : une feature absente ou périmée reste à None
+            # pour ne pas être comptée par Stat.append
+            fresh = {k: v for k, v in data.items() if k not in data["stale"]}
+            cy = fresh.get("cycling") or {}
+            hr = fresh.get("heart_rate") or {}
+        else:
+            cy = data.get("cycling", DEFAULT_CYLCING)
+            hr = data.get("heart_rate", DEFAULT_HR)
+        tmp = asdict(cy) if is_dataclass(cy) else dict(cy)
+        tmp.update(asdict(hr) if is_dataclass(hr) else hr)
+        # flux rééchantillonné (voir core.sequencer.resample) : instant de la grille
+        tmp["timestamp"] = data["timestamp"] if "timestamp" in data else Time.time()
+        names = {x.name for x in fields(cls)}
         return cls(
-            **tmp
+            **{k: v for k, v in tmp.items() if k in names}
         )
 
 
@@ -58,11 +67,14 @@ class Stat:
 
 
 
-    def __init__(self):
+    def __init__(self, rider=None):
         d = datetime.datetime.now()
         name = d.strftime("%Y%m%d_%H%M%S")
         self._fields = list(self._dataclass_.__dataclass_fields__)
         self.root_dir =  config.app_data_dir / "data" / name
+        if rider:
+            # séance à plusieurs vélos : un dossier par cycliste
+            self.root_dir = self.root_dir / rider
         self.root_dir.mkdir(exist_ok=True, parents=True)
         self.csv_fd = open(self.root_dir / "data.csv", "w")
         self.data = []
@@ -21,6 +21,9 @@ def deep_update(mapping, *updating_mappings):
     return updated_mapping
 
 
+# cycliste des appareils et controllers ajoutés sans rider
+DEFAULT_RIDER = "default"
+
 
 class SequencerConfig:
 
@@ -35,7 +38,9 @@ class SequencerConfig:
             "controllers" : {
 
             },
-            "period" : 1
+            "period" : 1,
+            # rééchantillonnage des flux sur la période : "hold", "linear" ou None
+            "resample" : "hold",
         }
 
     def to_json(self):
@@ -59,21 +64,47 @@ class SequencerConfig:
     def ble_clients(self):
         return self._data["ble_clients"]
 
-
-    def add_controller(self, name, params=None, **kwargs):
+    @property
+    def riders(self):
+        """{rider: {"ble_clients": ..., "controllers": ...}}, cycliste par défaut compris s'il a des appareils"""
+        ret = {}
+        if self.ble_clients or not self._data.get("riders"):
+            ret[DEFAULT_RIDER] = {
+                "ble_clients": self.ble_clients,
+                "controllers": self.controllers,
+            }
+        ret.update(self._data.get("riders", {}))
+        return ret
+
+    def _rider(self, rider):
+        if rider is None or rider == DEFAULT_RIDER:
+            return self._data
+        return self._data.setdefault("riders", {}).setdefault(rider, {
+            "ble_clients": {},
+            "controllers": {},
+        })
+
+    def add_controller(self, name, params=None, rider=None, **kwargs):
         kwargs.update(params or {})
-        self._data["controllers"][name] = {
+        self._rider(rider)["controllers"][name] = {
             "name" : name,
             "params" : kwargs
         }
 
-    def add_ble_client(self, device_name, feature, params=None, **kwargs):
+    def add_ble_client(self, device_name, feature, params=None, required=True, timeout=None, rider=None, **kwargs):
+        """
+        :param required: si False, la séance démarre même si l'appareil ne se connecte pas
+        :param timeout: délai de connexion en secondes (défaut du séquenceur si None)
+        :param rider: cycliste auquel appartient l'appareil (séance à plusieurs vélos)
+        """
         kwargs.update(params or {})
 
-        self._data["ble_clients"][feature] = {
+        self._rider(rider)["ble_clients"][feature] = {
             "feature": feature,
             "params": kwargs,
-            "device": device_name
+            "device": device_name,
+            "required": required,
+            "timeout": timeout,
         }
 
     def add_device(self, name, address):
@@ -87,6 +118,14 @@ class SequencerConfig:
     def period(self, x):
         self._data["period"] = x
 
+    @property
+    def resample(self):
+        return self._data.get("resample", "hold")
+
+    @resample.setter
+    def resample(self, x):
+        self._data["resample"] = x
+
 
 
 class Config:
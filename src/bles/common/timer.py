@@ -1,14 +1,86 @@
+import asyncio
+import os
 import threading
 import time
+from contextlib import contextmanager
+
+
+class Clock:
+    """Horloge réelle"""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, t):
+        if t > 0:
+            time.sleep(t)
+
+    def wait(self, event, timeout=None):
+        return event.wait(timeout)
+
+    def scale(self, t):
+        """Durée réelle correspondant à une durée de cette horloge"""
+        return t
+
+
+class AcceleratedClock(Clock):
+    """
+    Horloge virtuelle qui avance `speed` fois plus vite que le temps réel :
+    sleep() et wait() durent `speed` fois moins longtemps.
+    """
+
+    def __init__(self, speed=1.0, start=None):
+        self.speed = speed
+        self._real_start = time.monotonic()
+        self._start = time.time() if start is None else start
+
+    def time(self):
+        return self._start + (time.monotonic() - self._real_start) * self.speed
+
+    def sleep(self, t):
+        if t > 0:
+            time.sleep(t / self.speed)
+
+    def wait(self, event, timeout=None):
+        return event.wait(None if timeout is None else max(timeout, 0) / self.speed)
+
+    def scale(self, t):
+        return t / self.speed
 
 
 class _Time:
 
     def __init__(self):
-        pass
+        speed = os.environ.get("BLES_CLOCK_SPEED")
+        self.clock = AcceleratedClock(float(speed)) if speed else Clock()
+
+    def set_clock(self, clock):
+        self.clock = clock
+
+    @contextmanager
+    def use_clock(self, clock):
+        old = self.clock
+        self.clock = clock
+        try:
+            yield clock
+        finally:
+            self.clock = old
 
     def time(self):
-        return time.time()
+        return self.clock.time()
+
+    def sleep(self, t):
+        return self.clock.sleep(t)
+
+    def wait(self, event, timeout=None):
+        return self.clock.wait(event, timeout)
+
+    async def asleep(self, t):
+        if t > 0:
+            await asyncio.sleep(self.clock.scale(t))
+
+    async def wait_for(self, aw, timeout=None):
+        return await asyncio.wait_for(aw, None if timeout is None else self.clock.scale(max(timeout, 0)))
 
 Time = _Time()
 
@@ -37,19 +109,19 @@ class Timer:
             self._timer_thread.join()
 
     def _timer(self):
-        last = time.time()
+        last = Time.time()
 
         print(f"timer start {threading.get_ident()}")
         self._timer_event.clear()
         while not self._timer_event.is_set():
-            next = last + 1
-            delta = next - time.time()
+            next = last + self._time
+            delta = next - Time.time()
             if delta > 0:
-                if self._timer_event.wait(delta):
+                if Time.wait(self._timer_event, delta):
                     if self._timer_event.is_set():
                         return
 
-            last = time.time()
+            last = Time.time()
             if self._timer_handler:
                 self._timer_handler()
         print("timer stop")
\ No newline at end of file
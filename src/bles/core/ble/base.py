@@ -1,11 +1,20 @@
 import asyncio
+import concurrent.futures
+import dataclasses
 import os
+import random
 import threading
 import time
 from abc import ABC, abstractmethod
 from queue import Queue
 
 from bleak import BleakClient
+from bleak.backends.device import BLEDevice
+from bleak.exc import BleakError
+
+from bles.common.timer import Time
+from bles.core.ble.record import RecordingBleakClient
+from bles.core.ble.runtime import SHARED_RUNTIME, get_runtime
 
 
 class FeatureNotAvailable(Exception): pass
@@ -13,9 +22,12 @@ class FeatureNotAvailable(Exception): pass
 
 class Message:
     _name_ = None
+    # clé de regroupement dans CommandScheduler (par défaut le champ ou le nom)
+    _key_ = None
     def __init__(self, name=None, **kwargs):
         self.name = name if name is not None else self._name_
         self.kwargs = kwargs
+        self.created = time.perf_counter()
 
     def __repr__(self):
         return f"<Message {self.name} {self.kwargs}>"
@@ -25,6 +37,11 @@ class Exit(Message):
     _name_ = "exit"
 
 
+class Resume(Message):
+    """Services (re)démarrés : les dernières consignes sont ré-appliquées"""
+    _name_ = "resume"
+
+
 class SetValue(Message):
     _name_ = "set_value"
     _field_ = None
@@ -49,23 +66,132 @@ def get_ble_client(feature, debug):
     return BaseBleClient._registered[feature][debug]
 
 
+class LatencyStats:
+    """Statistiques de latence (en secondes)"""
+
+    def __init__(self):
+        self.count = 0
+        self.last = None
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, x):
+        self.count += 1
+        self.last = x
+        self.total += x
+        self.max = max(self.max, x)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_json(self):
+        return {
+            "count": self.count,
+            "last": self.last,
+            "mean": self.mean,
+            "max": self.max,
+        }
+
+
+class CommandScheduler:
+    """
+    File de commandes d'un client : seule la dernière commande en attente de
+    chaque type est conservée, et deux écritures sont espacées d'au moins
+    min_interval secondes. Les commandes gardent l'ordre de leur dernier push.
+    """
+
+    def __init__(self, min_interval=0):
+        self.min_interval = min_interval
+        self._pending = {}
+        self._last = {}
+        self._last_write = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @staticmethod
+    def key(message):
+        return message._key_ or getattr(message, "field", None) or message.name
+
+    def __len__(self):
+        return len(self._pending)
+
+    def push(self, message):
+        key = self.key(message)
+        if self._pending.pop(key, None) is not None:
+            # la commande remplacée est retirée, la nouvelle passe en fin de file
+            self.dropped += 1
+        self._pending[key] = message
+
+    def delay(self):
+        """Attente avant la prochaine écriture, None si rien n'est en attente"""
+        if not self._pending:
+            return None
+        if self._last_write is None:
+            return 0
+        return max(0, self._last_write + self.min_interval - time.monotonic())
+
+    def pop(self):
+        key = next(iter(self._pending))
+        self._last_write = time.monotonic()
+        self.sent += 1
+        return self._pending.pop(key)
+
+    def done(self, message):
+        # la dernière consigne écrite passe en fin : restore() la ré-applique en dernier
+        key = self.key(message)
+        self._last.pop(key, None)
+        self._last[key] = message
+
+    def retry(self, message):
+        """Remet en attente une commande non écrite, sauf si une plus récente l'a remplacée"""
+        self._pending.setdefault(self.key(message), message)
+
+    def restore(self):
+        """Remet en attente la dernière consigne écrite de chaque type"""
+        for key, message in self._last.items():
+            if key not in self._pending:
+                message.created = time.perf_counter()
+                self._pending[key] = message
+        self._last_write = None
+
+    def to_json(self):
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "min_interval": self.min_interval,
+        }
+
 
 class BaseBleClient(ABC):
 
     _data_class_ : type = None
     _feature_ = None
     _debug_ = False
+    # client hébergé par la boucle partagée (runtime.BleRuntime) plutôt que par son propre thread
+    _shared_runtime_ = SHARED_RUNTIME
 
     _registered = {}
 
     def __init__(self):
-        self.start_time = time.time()
+        self.start_time = Time.time()
         self.data = None
-        self._connection_event = threading.Event()
+        # état de connexion, protégé par une condition pour wait_for_connection
+        self._state = threading.Condition()
+        self._connected_state = False
+        self._running = False
+        self._connect_start = None
+        self.connect_duration = None
         self._thread = None
+        self._task = None
         self._on_disconnect = None
         self._on_connect = None
         self._handlers = []
+        self._seq = 0
+        self._gap = False
 
     def get_status(self):
         return {
@@ -73,34 +199,70 @@ class BaseBleClient(ABC):
         }
 
     def _thread_main(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        try:
+            await self._athread_main()
+        finally:
+            self._set_running(False)
+
+    async def _athread_main(self):
         raise NotImplementedError()
 
     def stop(self):
         raise NotImplementedError()
 
-    def _notify(self):
+    def _notify(self, data):
         for handler in self._handlers:
-            handler(self._feature_, self.data)
+            handler(self._feature_, data)
 
     def _get_time(self):
-        return time.time() - self.start_time
+        return Time.time() - self.start_time
 
     def _set_data(self, **kwargs):
+        # les échantillons sont immuables : un nouvel objet par notification,
+        # partagé tel quel par tous les consommateurs
+        self._seq += 1
         kwargs["timestamp"] = self._get_time()
+        kwargs["monotonic"] = time.monotonic()
+        kwargs["seq"] = self._seq
+        # durée sans données si une déconnexion a eu lieu depuis le dernier échantillon
+        kwargs["gap"] = kwargs["monotonic"] - self.data.monotonic if self._gap and self.data else 0.0
+        self._gap = False
         if self.data is not None:
-            self.data.__dict__.update(kwargs)
+            data = dataclasses.replace(self.data, **kwargs)
         else:
-            self.data = self._data_class_(**kwargs)
+            data = self._data_class_(**kwargs)
+        self.data = data
 
-        self._notify()
+        self._notify(data)
 
 
     def run_thread(self):
-        self._thread = threading.Thread(target=self._thread_main)
-        self._thread.start()
+        self._connect_start = time.monotonic()
+        self.connect_duration = None
+        self._set_running(True)
+        if self._shared_runtime_:
+            self._task = get_runtime().submit(self._run())
+        else:
+            self._thread = threading.Thread(target=self._thread_main)
+            self._thread.start()
+
 
+    def abort(self):
+        """Arrêt immédiat, y compris pendant la connexion (boucle partagée uniquement)"""
+        if self._task:
+            self._task.cancel()
+        self.stop()
 
     def join(self):
+        if self._task:
+            try:
+                self._task.result()
+            except concurrent.futures.CancelledError:
+                pass
+            self._task = None
         if self._thread:
             self._thread.join()
             self._thread = None
@@ -116,8 +278,21 @@ class BaseBleClient(ABC):
     def is_connected(self):
         raise NotImplementedError()
 
+    def _set_running(self, running):
+        with self._state:
+            self._running = running
+            self._state.notify_all()
+
+    def _set_connected(self, connected):
+        with self._state:
+            self._connected_state = connected
+            if connected and self._connect_start is not None:
+                self.connect_duration = time.monotonic() - self._connect_start
+            self._state.notify_all()
+
     def _on_disconnect_wrapper(self, client):
-        self._connection_event.set()
+        self._gap = True
+        self._set_connected(False)
         if self._on_disconnect:
             self._on_disconnect(self)
 
@@ -128,9 +303,13 @@ class BaseBleClient(ABC):
         self._on_connect = fct
 
     def wait_for_connection(self, timeout):
-        if self.is_connected: return True
-        self._connection_event.clear()
-        return self._connection_event.wait(timeout)
+        """
+        Attend la connexion, au plus timeout secondes (None: indéfiniment).
+        Retourne False si le client s'est arrêté sans se connecter.
+        """
+        with self._state:
+            self._state.wait_for(lambda: self._connected_state or not self._running, timeout)
+            return self._connected_state
 
 class EventMixin:
 
@@ -138,28 +317,88 @@ class EventMixin:
         self._changed = threading.Event()
         self.queue = Queue()
         self.do_continue = True
-
+        self._event_lock = threading.Lock()
+        self._loop = None
+        self._aqueue = None
+
+    def _bind_loop(self):
+        """
+        A appeler depuis la boucle asyncio qui consomme les évènements : ils
+        sont ensuite livrés directement dans une asyncio.Queue de cette boucle.
+        """
+        with self._event_lock:
+            self._loop = asyncio.get_running_loop()
+            self._aqueue = asyncio.Queue()
+            # évènements reçus avant le démarrage de la boucle
+            while not self.queue.empty():
+                self._aqueue.put_nowait(self.queue.get())
+
+    def _unbind_loop(self):
+        with self._event_lock:
+            self._loop = None
+
+    async def _next_event(self):
+        return await self._aqueue.get()
+
+    def _pending_events(self):
+        while not self._aqueue.empty():
+            yield self._aqueue.get_nowait()
 
     def _add_event(self, event):
 
         if isinstance(event, type) and issubclass(event, Message):
             event = event()
-        self.queue.put(event)
+        with self._event_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._aqueue.put_nowait, event)
+                return
+            self.queue.put(event)
         self._changed.set()
 
     def stop(self):
         self._add_event(Exit())
 
 
+class ReconnectPolicy:
+    """Attente exponentielle avec gigue entre deux tentatives de connexion"""
+
+    def __init__(self, initial=1, maximum=30, factor=2, jitter=0.5, max_attempts=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+
+    def delay(self, attempt):
+        """Délai avant la tentative `attempt` (0 = première reconnexion), None pour abandonner"""
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return None
+        delay = min(self.maximum, self.initial * self.factor ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1)
+
+
 class BleClient(EventMixin, BaseBleClient):
 
-    def __init__(self, addresse):
+    def __init__(self, addresse, min_write_interval=0, reconnect=True, record=None):
         BaseBleClient.__init__(self)
         EventMixin.__init__(self)
         self._driver = addresse
-        if isinstance(self._driver, str):
+        if isinstance(self._driver, (str, BLEDevice)):
+            # un BLEDevice issu de scan.DeviceDiscovery évite le scan interne de BleakClient
             self._driver = BleakClient(addresse)
+        if record:
+            # journal des échanges GATT bruts, rejouable avec record.ReplayBleakClient
+            self._driver = RecordingBleakClient(self._driver, record, self._feature_)
         self._driver.set_disconnected_callback(self._on_disconnect_wrapper)
+        self._ready = None
+        self.command_latency = LatencyStats()
+        self.scheduler = CommandScheduler(min_write_interval)
+        if reconnect is True:
+            reconnect = ReconnectPolicy()
+        self.reconnect = reconnect or None
+        self.reconnections = 0
+        # vrai après la première connexion réussie (les tentatives ratées ne comptent pas)
+        self.connected_once = False
 
     @property
     def is_connected(self):
@@ -168,7 +407,10 @@ class BleClient(EventMixin, BaseBleClient):
     def get_status(self):
         data = super().get_status()
         data.update({
-            "address" : self.addresse
+            "address" : self._driver.address,
+            "command_latency": self.command_latency.to_json(),
+            "commands": self.scheduler.to_json(),
+            "reconnections": self.reconnections,
         })
         return data
 
@@ -177,8 +419,15 @@ class BleClient(EventMixin, BaseBleClient):
         print(f"Connecting to {self}")
         ret = await self._driver.__aenter__()
         print(f"Driver loaded for {self}")
-        await self._start_service()
-        self._connection_event.set()
+        try:
+            await self._start_service()
+        except BaseException:
+            await self._driver.disconnect()
+            raise
+        self.connected_once = True
+        self._ready.set()
+        self._aqueue.put_nowait(Resume())
+        self._set_connected(True)
         print(f"Connected to {self}")
         if self._on_connect:
             self._on_connect(self)
@@ -187,55 +436,101 @@ class BleClient(EventMixin, BaseBleClient):
 
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self._stop_services()
+        if self._driver.is_connected:
+            await self._stop_services()
         return await self._driver.__aexit__(exc_type, exc_val, exc_tb)
 
+    def _on_disconnect_wrapper(self, client):
+        if self._ready is not None:
+            self._ready.clear()
+        super()._on_disconnect_wrapper(client)
+
 
     async def bt_task(self):
-        async with self:
-            while self.do_continue:
-                await asyncio.sleep(1)
+        attempt = 0
+        while self.do_continue:
+            try:
+                async with self:
+                    attempt = 0
+                    while self.do_continue and self._driver.is_connected:
+                        await asyncio.sleep(1)
+            except (BleakError, OSError, asyncio.TimeoutError) as err:
+                print(f"Connexion à {self} impossible: {err}")
+
+            if not self.do_continue:
+                return
+            self._ready.clear()
+            delay = self.reconnect.delay(attempt) if self.reconnect else None
+            if delay is None:
+                print(f"{self} : abandon de la reconnexion")
+                return
+            attempt += 1
+            self.reconnections += 1
+            print(f"Reconnexion de {self} dans {delay:.1f}s (tentative {attempt})")
+            await asyncio.sleep(delay)
+
+    def _schedule(self, message):
+        assert isinstance(message, Message)
+        if isinstance(message, Exit):
+            self.do_continue = False
+        elif isinstance(message, Resume):
+            self.scheduler.restore()
+        else:
+            self.scheduler.push(message)
+        return self.do_continue
 
     async def cmd_task(self):
-        timer = 1
+        scheduler = self.scheduler
         while self.do_continue:
-            last_timer = time.time()
-            while self.do_continue:
-                while not self.queue.empty():
-                    next = self.queue.get()
-                    assert isinstance(next, Message)
-                    if isinstance(next, Exit):
-                        self.do_continue = False
-                        return
-                    else:
-                        await self._on_message(next)
-
-                sleep_time = None
-                do_wait = True
-                if timer is not None:
-                    next = timer + last_timer
-                    sleep_time = next - time.time()
-                    if sleep_time<=0: do_wait=False
-
-                if self.do_continue:
-                    self._changed.clear()
-                    if sleep_time and sleep_time>0:
-                        await asyncio.sleep(sleep_time)
-
-                last_timer = time.time()
+            # on regroupe tout ce qui est arrivé avant d'écrire
+            for next in self._pending_events():
+                if not self._schedule(next):
+                    return
+
+            # les commandes attendent que les services GATT soient prêts :
+            # __aenter__ envoie Resume une fois connecté
+            delay = scheduler.delay() if self._ready.is_set() else None
+            if delay is None or delay > 0:
+                try:
+                    next = await asyncio.wait_for(self._next_event(), delay)
+                except asyncio.TimeoutError:
+                    continue
+                if not self._schedule(next):
+                    return
+                continue
+
+            next = scheduler.pop()
+            try:
+                await self._on_message(next)
+            except (FeatureNotAvailable, ValueError) as err:
+                scheduler.failed += 1
+                print(f"Commande {next} refusée par {self}: {err}")
+                continue
+            except (BleakError, OSError, asyncio.TimeoutError) as err:
+                # déconnexion en cours : la consigne sera écrite après reconnexion
+                scheduler.failed += 1
+                scheduler.retry(next)
+                print(f"Echec de l'écriture de {next} sur {self}: {err}")
+                continue
+            scheduler.done(next)
+            self.command_latency.add(time.perf_counter() - next.created)
 
 
     async def _athread_main(self):
         self.do_continue = True
-        loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._bind_loop()
         bt_task = asyncio.create_task(self.bt_task() )
         cmd_task = asyncio.create_task(self.cmd_task() )
-        await asyncio.wait([bt_task, cmd_task], return_when=asyncio.FIRST_COMPLETED)
-        bt_task.cancel()
-
-    def _thread_main(self):
-        asyncio.run(self._athread_main())
-
+        try:
+            await asyncio.wait([bt_task, cmd_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # aussi quand abort() annule cette tâche : sinon bt_task continue de se reconnecter
+            bt_task.cancel()
+            cmd_task.cancel()
+            self._unbind_loop()
+            if isinstance(self._driver, RecordingBleakClient):
+                self._driver.close()
 
 
     @abstractmethod
@@ -1,13 +1,14 @@
+import asyncio
+import itertools
+import math
 import random
-import threading
-import time
-from abc import abstractmethod
-from asyncio import Queue
 
+from bles.common.timer import Time
 from bles.core.ble.base import BaseBleClient, EventMixin, Exit, register_ble_client, Message
 from bles.core.ble import features
 from bles.core.ble.fitness import SetResistance, SetPower, SetSimulationParam, CyclingData
 from bles.core.ble.heart import HRSState
+from bles.core.ble.session import SessionReader, CYCLING_FIELDS
 
 
 
@@ -17,17 +18,31 @@ class DebugBleClient(BaseBleClient, EventMixin):
     _connection_time_ = 0.2
 
 
-    def __init__(self, timer=None):
+    def __init__(self, timer=None, seed=None, replay=None, speed=1.0, start=0):
+        """
+        :param timer: période d'envoi des données en secondes (1 par défaut, 0.005 pour 200Hz)
+        :param seed: graine du générateur aléatoire, pour des séances reproductibles
+        :param replay: séance enregistrée (fichier ou SessionReader) à rejouer au lieu de simuler
+        :param speed: vitesse du rejeu (None ou 0 : aussi vite que possible)
+        :param start: position de départ du rejeu, en secondes depuis le début de la séance
+        """
         BaseBleClient.__init__(self)
         EventMixin.__init__(self)
         self.simu = None
-        self.timer = timer
+        self.timer = timer or 1
+        self.random = random.Random(seed)
         self._connected = False
-
-    def __enter__(self):
-        self._start_service()
+        if replay is not None and not isinstance(replay, SessionReader):
+            replay = SessionReader(replay)
+        self.replay = replay
+        self.speed = speed
+        if replay is not None and start:
+            replay.seek(start)
+
+    async def __aenter__(self):
+        await self._start_service()
         self._connected = True
-        self._connection_event.set()
+        self._set_connected(True)
         if self._on_connect:
             self._on_connect(self)
 
@@ -38,49 +53,84 @@ class DebugBleClient(BaseBleClient, EventMixin):
     def is_connected(self):
         return self._connected
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
         self._stop_services()
         self._connected = False
+        self._set_connected(False)
 
     def set_debug_simulator(self, simu):
         self.simu = simu
 
-    def _thread_main(self, iteration=None):
+    def _handle_event(self, next):
+        assert isinstance(next, Message)
+        if isinstance(next, Exit):
+            self.do_continue = False
+        else:
+            self._on_message(next)
+        return self.do_continue
+
+    def _schedule(self):
+        """Echéances (en secondes depuis le départ) et ligne rejouée, None hors rejeu"""
+        if self.replay is None:
+            for n in itertools.count(1):
+                yield n * self.timer, None
+        else:
+            t0 = None
+            for row in self.replay:
+                if t0 is None:
+                    t0 = row["timestamp"]
+                yield (row["timestamp"] - t0) / self.speed if self.speed else 0, row
+
+    async def _athread_main(self):
         self.do_continue = True
-        timer = 1
-        last_timer = time.time()
-        while self.do_continue:
-            with self:
+        self._bind_loop()
+        try:
+            async with self:
+                # échéances t0 + n * période : pas de dérive, même à haute fréquence
+                start = Time.time()
+                schedule = self._schedule()
+                deadline, row = next(schedule, (None, None))
                 while self.do_continue:
-                    while not self.queue.empty():
-                        next = self.queue.get()
-                        assert isinstance(next, Message)
-                        if isinstance(next, Exit):
-                            self.do_continue = False
+                    for event in self._pending_events():
+                        if not self._handle_event(event):
                             return
-                        else:
-                            self._on_message(next)
 
-                    sleep_time = 0
-                    if timer is not None:
-                        next = timer + last_timer
-                        sleep_time = next - time.time()
+                    if deadline is None:
+                        # fin du rejeu : plus que les commandes
+                        if not self._handle_event(await self._next_event()):
+                            return
+                        continue
 
+                    sleep_time = start + deadline - Time.time()
                     if sleep_time > 0:
-                        if self._changed.wait(sleep_time):
-                            self._changed.clear()
-
-                    if timer is not None:
+                        try:
+                            event = await Time.wait_for(self._next_event(), sleep_time)
+                        except asyncio.TimeoutError:
+                            event = None
+
+                        if event is not None:
+                            if not self._handle_event(event):
+                                return
+                            continue
+                    else:
+                        # en retard : on laisse tourner les autres clients de la boucle
+                        await asyncio.sleep(0)
+
+                    if row is None:
                         self._on_timer()
-                        last_timer = time.time()
+                    else:
+                        self._on_replay(row)
+                    deadline, row = next(schedule, (None, None))
+        finally:
+            self._unbind_loop()
 
     def stop(self):
         self._add_event(Exit())
 
 
-    def _start_service(self):
+    async def _start_service(self):
         if self._connection_time_:
-            time.sleep(self._connection_time_)
+            await Time.asleep(self._connection_time_)
 
     def _stop_services(self):
         pass
@@ -97,6 +147,9 @@ class DebugBleClient(BaseBleClient, EventMixin):
     def _on_timer(self):
         pass
 
+    def _on_replay(self, row):
+        pass
+
 
 @register_ble_client
 class FitnessClientDebug(DebugBleClient):
@@ -106,6 +159,9 @@ class FitnessClientDebug(DebugBleClient):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._nominal_power = 0
+        # ticks entiers : une somme de flottants (10 x 0.1 < 1) ferait perdre des pas
+        self._ticks = 0
+        self._simu_steps = 0
         self.power_range = [0, 3000]
         self.resistance_range = [0, 100]
 
@@ -124,13 +180,18 @@ class FitnessClientDebug(DebugBleClient):
             self._nominal_power = v
 
     def _on_timer(self):
-        effective_power = max(self._nominal_power + random.randint(-10, 10),0)
+        effective_power = max(self._nominal_power + self.random.randint(-10, 10),0)
 
         speed = effective_power * 0.1
-        self.simu.step(effective_power)
+        # le simulateur avance d'un pas par seconde simulée, quelle que soit la fréquence
+        self._ticks += 1
+        seconds = math.floor(round(self._ticks * self.timer, 9))
+        for _ in range(seconds - self._simu_steps):
+            self.simu.step(effective_power)
+        self._simu_steps = seconds
         self._set_data(
             speed=speed,
-            cadence = random.randint(60,100),
+            cadence = self.random.randint(60,100),
             distance = 0,
             resistance = 0,
             power = effective_power
@@ -138,6 +199,10 @@ class FitnessClientDebug(DebugBleClient):
 
 
 
+    def _on_replay(self, row):
+        self._set_data(**{k: row[k] for k in CYCLING_FIELDS if k in row})
+
+
 @register_ble_client
 class HRClientDebug(DebugBleClient):
     _data_class_ = HRSState
@@ -152,3 +217,7 @@ class HRClientDebug(DebugBleClient):
             bpm=self.simu.last_bpm
         )
 
+    def _on_replay(self, row):
+        if "bpm" in row:
+            self._set_data(bpm=row["bpm"])
+
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import math
+import random
+import struct
+import time
+
+from bles.common.timer import Time
+from bles.core.simulator.base_simulator import PowerSimulator
+
+FTMS_FEATURE = "00002acc-0000-1000-8000-00805f9b34fb"
+FTMS_INDOOR_BIKE_DATA = "00002ad2-0000-1000-8000-00805f9b34fb"
+FTMS_TRAINING_STATUS = "00002ad3-0000-1000-8000-00805f9b34fb"
+FTMS_RESISTANCE_RANGE = "00002ad6-0000-1000-8000-00805f9b34fb"
+FTMS_POWER_RANGE = "00002ad8-0000-1000-8000-00805f9b34fb"
+FTMS_CONTROL_POINT = "00002ad9-0000-1000-8000-00805f9b34fb"
+FTMS_MACHINE_STATUS = "00002ada-0000-1000-8000-00805f9b34fb"
+HR_MEASUREMENT = "00002a37-0000-1000-8000-00805f9b34fb"
+
+# opcodes du control point FTMS
+REQUEST_CONTROL = 0x00
+RESET = 0x01
+SET_TARGET_RESISTANCE = 0x04
+SET_TARGET_POWER = 0x05
+SET_SIMULATION = 0x11
+RESPONSE = 0x80
+
+SUCCESS = 0x01
+NOT_SUPPORTED = 0x02
+INCORRECT_PARAMETER = 0x03
+CONTROL_NOT_PERMITTED = 0x05
+
+
+class FakeDevice:
+    """
+    Home trainer + ceinture cardio simulés : la puissance demandée est
+    appliquée au simulateur à chaque période, la FC en est issue.
+    """
+
+    def __init__(self, simulator=None, power_range=(0, 2000, 1), resistance_range=(0, 100, 1), seed=None):
+        self.simu = simulator or PowerSimulator(init_freq=80)
+        self.power_range = power_range
+        self.resistance_range = resistance_range
+        self.random = random.Random(seed)
+        self.control = False
+        self.target_power = 0
+        self.resistance = 0
+        self.simulation = None
+        self.power = 0
+        self.cadence = 0
+        self.distance = 0.0
+        self.time = 0
+        # périodes écoulées et pas du simulateur (1 par seconde) déjà faits
+        self._ticks = 0
+        self._simu_steps = 0
+        self._owner = None
+
+    def features(self):
+        # cadence, distance, résistance ; mesure de puissance
+        machine = bytes([0b10000110, 0b01000000, 0, 0])
+        # consignes de résistance et de puissance ; paramètres de simulation
+        target = bytes([0b00001100, 0b00100000, 0, 0])
+        return machine + target
+
+    def control_point(self, opcode, data):
+        """Applique une commande du control point, retourne le code résultat"""
+        if opcode == REQUEST_CONTROL:
+            self.control = True
+            return SUCCESS
+        if not self.control:
+            return CONTROL_NOT_PERMITTED
+        if opcode == RESET:
+            self.target_power = 0
+            self.resistance = 0
+            self.simulation = None
+            return SUCCESS
+        if opcode == SET_TARGET_POWER:
+            power, = struct.unpack_from("<h", data)
+            if not self.power_range[0] <= power <= self.power_range[1]:
+                return INCORRECT_PARAMETER
+            self.target_power = power
+            return SUCCESS
+        if opcode == SET_TARGET_RESISTANCE:
+            level = data[0]
+            if not self.resistance_range[0] <= level <= self.resistance_range[1]:
+                return INCORRECT_PARAMETER
+            self.resistance = level
+            return SUCCESS
+        if opcode == SET_SIMULATION:
+            self.simulation = struct.unpack_from("<hhBB", data)
+            return SUCCESS
+        return NOT_SUPPORTED
+
+    def step(self, owner, period):
+        """Avance d'une période ; seul le premier client qui l'appelle fait avancer l'appareil"""
+        if self._owner is None:
+            self._owner = owner
+        if owner is not self._owner:
+            return
+        self.power = max(0, self.target_power + self.random.randint(-5, 5)) if self.target_power else 0
+        self.cadence = self.random.randint(80, 95) if self.power else 0
+        self.distance += self.power * 0.04 * period
+        # le simulateur de FC avance d'un pas par seconde écoulée, quelle que soit la période
+        self._ticks += 1
+        seconds = math.floor(round(self._ticks * period, 9))
+        for _ in range(seconds - self._simu_steps):
+            self.simu.step(self.power)
+        self._simu_steps = seconds
+        self.time += period
+
+    @property
+    def speed(self):
+        return self.power * 0.1
+
+    @property
+    def bpm(self):
+        return int(self.simu.last_bpm)
+
+    def indoor_bike_data(self):
+        # vitesse (toujours présente), cadence, distance, résistance, puissance
+        flags = 0b01110100
+        return (struct.pack("<BBHH", flags, 0, int(self.speed * 100), int(self.cadence * 2))
+                + int(self.distance).to_bytes(3, "little")
+                + struct.pack("<hh", self.resistance, self.power))
+
+    def hr_measurement(self):
+        return bytes([0, min(self.bpm, 255)])
+
+
+class FakeBleakClient:
+    """
+    Remplace BleakClient pour un FakeDevice : lectures des caractéristiques
+    FTMS, notifications périodiques et indications du control point.
+    latency (s) s'applique à chaque écriture et à chaque indication, loss est
+    la probabilité de perdre une notification ou une indication.
+    """
+
+    def __init__(self, device=None, address="FA:KE:00:00:00:00", services=("ftms", "hrs"),
+                 period=1, latency=0, loss=0, seed=None):
+        self.device = device or FakeDevice(seed=seed)
+        self.address = address
+        self.services = services
+        self.period = period
+        self.latency = latency
+        self.loss = loss
+        self.random = random.Random(seed)
+        self._connected = False
+        self._callbacks = {}
+        self._task = None
+        self._on_disconnect = None
+        self.lost = 0
+
+    @property
+    def is_connected(self):
+        return self._connected
+
+    def set_disconnected_callback(self, callback):
+        self._on_disconnect = callback
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.latency)
+        self._connected = True
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+    async def disconnect(self):
+        self._connected = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def drop(self):
+        """Coupure du lien (appareil hors de portée) : le callback de déconnexion est appelé"""
+        if not self._connected:
+            return
+        self._connected = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._on_disconnect is not None:
+            self._on_disconnect(self)
+
+    def _lost(self):
+        if self.loss and self.random.random() < self.loss:
+            self.lost += 1
+            return True
+        return False
+
+    async def read_gatt_char(self, char_specifier, **kwargs):
+        await asyncio.sleep(self.latency)
+        uuid = str(char_specifier)
+        if uuid == FTMS_FEATURE:
+            return bytearray(self.device.features())
+        if uuid == FTMS_POWER_RANGE:
+            return bytearray(struct.pack("<hhH", *self.device.power_range))
+        if uuid == FTMS_RESISTANCE_RANGE:
+            return bytearray(struct.pack("<hhH", *self.device.resistance_range))
+        raise KeyError(f"Caractéristique {uuid} non simulée")
+
+    async def write_gatt_char(self, char_specifier, data, response=None):
+        if str(char_specifier) != FTMS_CONTROL_POINT:
+            raise KeyError(f"Caractéristique {char_specifier} non simulée en écriture")
+        await asyncio.sleep(self.latency)
+        opcode = data[0]
+        result = self.device.control_point(opcode, bytes(data[1:]))
+        callback = self._callbacks.get(FTMS_CONTROL_POINT)
+        if callback is not None and not self._lost():
+            asyncio.get_running_loop().call_later(self.latency, callback, FTMS_CONTROL_POINT,
+                                                  bytearray([RESPONSE, opcode, result]))
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        self._callbacks[str(char_specifier)] = callback
+        if self._task is None:
+            self._task = asyncio.create_task(self._tick())
+
+    async def stop_notify(self, char_specifier):
+        self._callbacks.pop(str(char_specifier), None)
+
+    def _notify(self, uuid, data):
+        callback = self._callbacks.get(uuid)
+        if callback is not None and not self._lost():
+            callback(uuid, bytearray(data))
+
+    async def _tick(self):
+        next = Time.time()
+        while self._connected:
+            next += self.period
+            await Time.asleep(next - Time.time())
+            self.device.step(self, self.period)
+            if "ftms" in self.services:
+                self._notify(FTMS_INDOOR_BIKE_DATA, self.device.indoor_bike_data())
+            if "hrs" in self.services:
+                self._notify(HR_MEASUREMENT, self.device.hr_measurement())
+
+
+def create_fake_clients(device=None, **kwargs):
+    """FitnessClient et HeartClient réels branchés sur le même FakeDevice"""
+    from bles.core.ble.fitness import FitnessClient
+    from bles.core.ble.heart import HeartClient
+
+    device = device or FakeDevice()
+    return (FitnessClient(FakeBleakClient(device, services=("ftms",), **kwargs)),
+            HeartClient(FakeBleakClient(device, services=("hrs",), **kwargs)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence aller-retour du control point FTMS sur des home trainers simulés")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("-d", "--duration", type=float, default=10)
+    parser.add_argument("-l", "--latency", type=float, default=0.02, help="latence de chaque échange (s)")
+    parser.add_argument("--loss", type=float, default=0, help="probabilité de perte d'un paquet")
+    parser.add_argument("-p", "--period", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    clients = []
+    for i in range(args.count):
+        seed = None if args.seed is None else args.seed + i
+        clients.extend(create_fake_clients(FakeDevice(seed=seed), period=args.period,
+                                           latency=args.latency, loss=args.loss, seed=seed))
+    received = [0]
+
+    def _count(feature, data):
+        received[0] += 1
+
+    for client in clients:
+        client.add_handler(_count)
+        client.run_thread()
+    for client in clients:
+        client.wait_for_connection(None)
+
+    start = time.time()
+    trainers = clients[::2]
+    while time.time() - start < args.duration:
+        for trainer in trainers:
+            trainer.set_power(random.randint(100, 300))
+        time.sleep(args.period)
+    elapsed = time.time() - start
+
+    for client in clients:
+        client.stop()
+    for client in clients:
+        client.join()
+
+    latencies = [x.control_latency for x in trainers if x.control_latency.count]
+    count = sum(x.count for x in latencies)
+    mean = sum(x.total for x in latencies) / count if count else float("nan")
+    worst = max((x.max for x in latencies), default=float("nan"))
+    print(f"{args.count} home trainers, {received[0]} données en {elapsed:.1f}s,"
+          f" aller-retour control point : {count} mesures, moyenne {mean * 1000:.1f}ms, max {worst * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,15 +6,17 @@ from queue import Queue
 
 from bleak import BleakClient
 from pycycling.fitness_machine_service import FitnessMachineService
+from bles.common.timer import Time
 from bles.core.ble import features
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
-from pycycling.ftms_parsers import IndoorBikeData
+from pycycling.ftms_parsers import IndoorBikeData, FTMSControlPointOpCode, FTMSControlPointResponseResultCode
 
-from bles.core.ble.base import BaseBleClient, FeatureNotAvailable, SetValue, register_ble_client, BleClient
+from bles.core.ble.base import BaseBleClient, FeatureNotAvailable, SetValue, register_ble_client, BleClient, \
+    LatencyStats
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CyclingData:
     power : int = 0
     resistance : int = 0
@@ -22,24 +24,35 @@ class CyclingData:
     cadence : float = 0.0
     distance : float = 0
     timestamp : float = 0
+    # numéro d'ordre par client et horloge monotone (time.monotonic)
+    seq : int = 0
+    monotonic : float = 0
+    # secondes sans données avant cet échantillon après une déconnexion, 0 sinon
+    gap : float = 0
 
 
     def copy(self, **kwargs):
-        data = dict(self.__dict__)
-        data.update(kwargs)
-        return self.__class__(**data)
+        return replace(self, **kwargs)
+
+
+# puissance, résistance et simulation sont des modes exclusifs du home trainer :
+# une seule consigne en attente, la dernière demandée
+TARGET = "target"
 
 
 class SetResistance(SetValue):
     _field_ = "resistance"
+    _key_ = TARGET
 
 
 class SetPower(SetValue):
     _field_ = "power"
+    _key_ = TARGET
 
 
 class SetSimulationParam(SetValue):
     _field_ = "simulation"
+    _key_ = TARGET
 
 
 
@@ -48,11 +61,29 @@ class FitnessClient(BleClient):
     _data_class_ = CyclingData
     _feature_ = features.cycling
 
-    def __init__(self, addresse, **other):
-        super().__init__(addresse)
+    _opcodes_ = {
+        SetPower: FTMSControlPointOpCode.SET_TARGET_POWER,
+        SetResistance: FTMSControlPointOpCode.SET_TARGET_RESISTANCE_LEVEL,
+        SetSimulationParam: FTMSControlPointOpCode.SET_INDOOR_BIKE_SIMULATION_PARAMETERS,
+    }
+
+    def __init__(self, addresse, min_write_interval=0.25, reconnect=True, record=None, **other):
+        super().__init__(addresse, min_write_interval, reconnect, record)
         self.ftms = FitnessMachineService(self._driver)
         self.ftms_features = None
         self.ftms_settings = None
+        # aller-retour écriture -> indication du control point
+        self.control_latency = LatencyStats()
+        self.control_errors = 0
+        self._control_requests = {}
+
+    def get_status(self):
+        data = super().get_status()
+        data.update({
+            "control_latency": self.control_latency.to_json(),
+            "control_errors": self.control_errors,
+        })
+        return data
 
     def _on_fitness_machine(self, data):
         pass
@@ -70,10 +101,17 @@ class FitnessClient(BleClient):
         pass
 
     def _on_control_point_response(self, data):
-        pass
+        start = self._control_requests.pop(data.request_code_enum, None)
+        if start is not None:
+            self.control_latency.add(time.perf_counter() - start)
+        if data.result_code_enum != FTMSControlPointResponseResultCode.SUCCESS:
+            self.control_errors += 1
+            print(f"Control point {data.request_code_enum.name}: {data.result_code_enum.name}")
 
     async def _start_service(self):
-        self.start_time = time.time()
+        if not self.connected_once:
+            # le temps de séance part de la première connexion réussie
+            self.start_time = Time.time()
         self.ftms_features =(await self.ftms.get_fitness_machine_feature())._asdict()
         self.target_setting_features = (await self.ftms.get_target_setting_feature())._asdict()
         self.power_range = None
@@ -150,6 +188,9 @@ class FitnessClient(BleClient):
 
     async def _on_message(self, next):
         v  = next.value
+        opcode = self._opcodes_.get(type(next))
+        if opcode is not None:
+            self._control_requests[opcode] = time.perf_counter()
         if isinstance(next, SetPower):
             if isinstance(v, float):
                 await self._set_target_power_rel(v)
@@ -1,31 +1,34 @@
 import os
-import time
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 from pycycling.heart_rate_service import HeartRateService
+from bles.common.timer import Time
 from bles.core.ble import features
 from bles.core.ble.base import register_ble_client, BleClient
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HRSState:
     bpm : int = 0
     timestamp : float = 0
+    # numéro d'ordre par client et horloge monotone (time.monotonic)
+    seq : int = 0
+    monotonic : float = 0
+    # secondes sans données avant cet échantillon après une déconnexion, 0 sinon
+    gap : float = 0
 
 
     def copy(self, **kwargs):
-        data = dict(self.__dict__)
-        data.update(kwargs)
-        return self.__class__(**data)
+        return replace(self, **kwargs)
 
 @register_ble_client
 class HeartClient(BleClient):
     _feature_ = features.heart_rate
     _data_class_ = HRSState
 
-    def __init__(self, addresse, **other):
-        super().__init__(addresse)
-        self.start_time = time.time()
+    def __init__(self, addresse, reconnect=True, record=None, **other):
+        super().__init__(addresse, reconnect=reconnect, record=record)
+        self.start_time = Time.time()
         self.hrs : HeartRateService = None
 
     def _on_data(self, data):
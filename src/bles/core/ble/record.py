@@ -0,0 +1,246 @@
+"""
+Enregistrement et rejeu des échanges GATT bruts d'un client BLE.
+
+Format du journal (little endian) :
+    MAGIC, u32 taille de l'entête, entête JSON (adresse, feature, date)
+    puis des enregistrements RECORD (type, uuid, t, taille) suivis des octets.
+Les uuid sont déclarés une fois (type UUID, octets = uuid en ascii) puis
+désignés par leur index ; t est en secondes depuis le début de l'enregistrement.
+"""
+import argparse
+import asyncio
+import json
+import struct
+import threading
+import time
+from pathlib import Path
+
+MAGIC = b"BLESLOG1"
+HEADER = struct.Struct("<I")
+RECORD = struct.Struct("<BBdH")
+
+UUID = 0
+NOTIFY = 1
+READ = 2
+WRITE = 3
+
+
+class LogWriter:
+
+    def __init__(self, file, **header):
+        self.file = Path(file)
+        self.file.parent.mkdir(exist_ok=True, parents=True)
+        self._fd = open(self.file, "wb")
+        self._uuids = {}
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        header = json.dumps(dict(header, created=time.time())).encode()
+        self._fd.write(MAGIC + HEADER.pack(len(header)) + header)
+
+    def _uuid(self, uuid):
+        uuid = str(uuid)
+        if uuid not in self._uuids:
+            self._uuids[uuid] = len(self._uuids)
+            data = uuid.encode()
+            self._fd.write(RECORD.pack(UUID, self._uuids[uuid], 0, len(data)) + data)
+        return self._uuids[uuid]
+
+    def write(self, kind, uuid, data):
+        data = bytes(data)
+        with self._lock:
+            if self._fd.closed:
+                return
+            index = self._uuid(uuid)
+            self._fd.write(RECORD.pack(kind, index, time.monotonic() - self._start, len(data)) + data)
+
+    def close(self):
+        with self._lock:
+            self._fd.close()
+
+
+def read_log(file):
+    """:return: (entête, [(type, uuid, t, octets), ...])"""
+    content = Path(file).read_bytes()
+    if not content.startswith(MAGIC):
+        raise ValueError(f"{file} n'est pas un journal BLE")
+    pos = len(MAGIC)
+    size, = HEADER.unpack_from(content, pos)
+    pos += HEADER.size
+    header = json.loads(content[pos:pos + size])
+    pos += size
+
+    uuids = {}
+    records = []
+    while pos < len(content):
+        kind, index, t, size = RECORD.unpack_from(content, pos)
+        pos += RECORD.size
+        data = content[pos:pos + size]
+        pos += size
+        if kind == UUID:
+            uuids[index] = data.decode()
+        else:
+            records.append((kind, uuids[index], t, data))
+    return header, records
+
+
+class RecordingBleakClient:
+    """Enveloppe d'un BleakClient qui journalise notifications, lectures et écritures"""
+
+    def __init__(self, driver, file, feature=None):
+        self._driver = driver
+        self._log = LogWriter(file, address=driver.address, feature=feature)
+
+    def __getattr__(self, item):
+        return getattr(self._driver, item)
+
+    async def __aenter__(self):
+        await self._driver.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await self._driver.__aexit__(exc_type, exc_val, exc_tb)
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        def _callback(sender, data):
+            self._log.write(NOTIFY, char_specifier, data)
+            return callback(sender, data)
+        return await self._driver.start_notify(char_specifier, _callback, **kwargs)
+
+    async def read_gatt_char(self, char_specifier, **kwargs):
+        ret = await self._driver.read_gatt_char(char_specifier, **kwargs)
+        self._log.write(READ, char_specifier, ret)
+        return ret
+
+    async def write_gatt_char(self, char_specifier, data, response=None):
+        self._log.write(WRITE, char_specifier, data)
+        return await self._driver.write_gatt_char(char_specifier, data, response)
+
+    def close(self):
+        self._log.close()
+
+
+class ReplayBleakClient:
+    """
+    Remplace BleakClient : les lectures renvoient les valeurs enregistrées et
+    les notifications sont rejouées à `speed` fois la vitesse réelle
+    (None : aussi vite que possible). Les écritures sont ignorées.
+    """
+
+    def __init__(self, file, speed=1.0):
+        self.header, records = read_log(file)
+        self.address = self.header.get("address", str(file))
+        self.speed = speed
+        self._reads = {}
+        for kind, uuid, t, data in records:
+            if kind == READ:
+                self._reads.setdefault(uuid, []).append(data)
+        self._notifications = [(uuid, t, data) for kind, uuid, t, data in records if kind == NOTIFY]
+        self._callbacks = {}
+        self._connected = False
+        self._task = None
+        self._on_disconnect = None
+        self.sent = 0
+        self.finished = threading.Event()
+
+    @property
+    def is_connected(self):
+        return self._connected
+
+    def set_disconnected_callback(self, callback):
+        self._on_disconnect = callback
+
+    async def __aenter__(self):
+        self._connected = True
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+    async def disconnect(self):
+        self._connected = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def read_gatt_char(self, char_specifier, **kwargs):
+        values = self._reads.get(str(char_specifier))
+        if not values:
+            raise KeyError(f"Aucune lecture enregistrée pour {char_specifier}")
+        # lectures dans l'ordre de l'enregistrement, la dernière est répétée
+        return bytearray(values.pop(0) if len(values) > 1 else values[0])
+
+    async def write_gatt_char(self, char_specifier, data, response=None):
+        pass
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        self._callbacks[str(char_specifier)] = callback
+        if self._task is None:
+            self._task = asyncio.create_task(self._replay())
+
+    async def stop_notify(self, char_specifier):
+        self._callbacks.pop(str(char_specifier), None)
+
+    async def _replay(self):
+        # laisse le client finir d'activer ses notifications
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        t0 = self._notifications[0][1] if self._notifications else 0
+        for i, (uuid, t, data) in enumerate(self._notifications):
+            if self.speed:
+                delay = (t - t0) / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 256 == 0:
+                await asyncio.sleep(0)
+            callback = self._callbacks.get(uuid)
+            if callback is not None:
+                callback(uuid, bytearray(data))
+                self.sent += 1
+        self.finished.set()
+
+
+def replay(file, speed=None, timeout=10):
+    """
+    Rejoue un journal à travers le client réel de sa feature.
+    :param timeout: délai de connexion (démarrage des services) en secondes
+    :return: (nombre d'échantillons reçus, durée en secondes)
+    :raise ValueError: si le client ne se connecte pas ou s'arrête avant la fin du journal
+        (lecture GATT absente de l'enregistrement...)
+    """
+    from bles.core.ble import get_ble_client
+
+    driver = ReplayBleakClient(file, speed)
+    client = get_ble_client(driver.header["feature"], False)(driver)
+    received = [0]
+
+    def _count(feature, data):
+        received[0] += 1
+
+    client.add_handler(_count)
+    start = time.perf_counter()
+    client.run_thread()
+    try:
+        if not client.wait_for_connection(timeout):
+            raise ValueError(f"{file} : pas de connexion au rejeu (journal incomplet ?)")
+        while not driver.finished.wait(0.1):
+            if not client.is_connected:
+                raise ValueError(f"{file} : client arrêté avant la fin du rejeu")
+        duration = time.perf_counter() - start
+    finally:
+        client.stop()
+        client.join()
+    return received[0], duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejoue un journal BLE à travers FitnessClient / HeartClient")
+    parser.add_argument("file")
+    parser.add_argument("-s", "--speed", type=float, default=0, help="vitesse de rejeu (0 : maximale)")
+    args = parser.parse_args()
+
+    count, duration = replay(args.file, args.speed or None)
+    print(f"{count} échantillons en {duration:.3f}s ({count / duration:.0f}/s)")
+
+
+if __name__ == '__main__':
+    main()
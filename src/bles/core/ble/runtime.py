@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+# "shared" : tous les clients BLE sont des tâches d'une même boucle asyncio,
+# "thread" : un thread (et une boucle) par client, comme auparavant
+SHARED_RUNTIME = os.environ.get("BLES_BLE_RUNTIME", "shared") == "shared"
+
+
+def context_switches():
+    """(volontaires, involontaires) pour tout le processus, None si indisponible"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_nvcsw, usage.ru_nivcsw
+
+
+class BleRuntime:
+    """
+    Boucle asyncio unique, dans un thread dédié, qui héberge tous les
+    clients BLE. Toutes les méthodes publiques sont utilisables depuis
+    n'importe quel thread.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._started = threading.Event()
+        self._tasks = set()
+        self._start_switches = None
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def in_runtime(self):
+        return threading.current_thread() is self._thread
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._started.clear()
+            self._start_switches = context_switches()
+            self._thread = threading.Thread(target=self._thread_main, name="ble-runtime", daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(self._started.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, coro):
+        """Lance une coroutine sur la boucle, retourne un concurrent.futures.Future"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self._tasks.add(future)
+        future.add_done_callback(self._tasks.discard)
+        return future
+
+    def call_soon(self, fct, *args):
+        if self.in_runtime() or not self.running:
+            # boucle arrêtée : aucun client ne s'y exécute
+            fct(*args)
+        else:
+            self.loop.call_soon_threadsafe(fct, *args)
+
+    def subscribe(self, client, handler):
+        """
+        Abonne handler aux données de client. La liste des handlers n'est
+        modifiée que depuis la boucle, les handlers y sont appelés.
+        :return: une fonction de désabonnement
+        """
+        self.call_soon(client.add_handler, handler)
+        return lambda: self.call_soon(client.remove_handler, handler)
+
+    def get_status(self):
+        ret = {
+            "mode": "shared" if SHARED_RUNTIME else "thread",
+            "running": self.running,
+            "tasks": len(self._tasks),
+            "threads": threading.active_count(),
+        }
+        switches = context_switches()
+        if switches is not None:
+            start = self._start_switches or (0, 0)
+            ret["context_switches"] = {
+                "voluntary": switches[0] - start[0],
+                "involuntary": switches[1] - start[1],
+            }
+        return ret
+
+
+_runtime = BleRuntime()
+
+def get_runtime():
+    return _runtime
+
+
+def _measure(count, duration, shared):
+    from bles.core.ble import features, get_ble_client
+    from bles.core.ble.base import BaseBleClient
+    from bles.core.simulator.base_simulator import PowerSimulator
+
+    BaseBleClient._shared_runtime_ = shared
+    clients = []
+    for _ in range(count):
+        simu = PowerSimulator(init_freq=80)
+        for feature in (features.cycling, features.heart_rate):
+            client = get_ble_client(feature, True)(timer=1)
+            client.set_debug_simulator(simu)
+            clients.append(client)
+
+    start_switches = context_switches()
+    for client in clients:
+        client.run_thread()
+    for client in clients:
+        client.wait_for_connection(None)
+    threads = threading.active_count()
+    time.sleep(duration)
+    switches = context_switches()
+
+    for client in clients:
+        client.stop()
+    for client in clients:
+        client.join()
+
+    ret = {"mode": "shared" if shared else "thread", "clients": len(clients), "threads": threads}
+    if switches is not None:
+        ret["context_switches"] = sum(switches) - sum(start_switches)
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare le nombre de threads et de changements de contexte"
+                                                 " entre la boucle partagée et un thread par client")
+    parser.add_argument("-n", "--count", type=int, default=20, help="nombre de vélos (2 clients chacun)")
+    parser.add_argument("-d", "--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    for shared in (False, True):
+        print(_measure(args.count, args.duration, shared))
+
+
+if __name__ == '__main__':
+    main()
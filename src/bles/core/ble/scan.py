@@ -1,32 +1,231 @@
+import argparse
 import asyncio
-from functools import partial
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
 
 from bleak import BleakScanner
+from bleak.exc import BleakError
 
+from bles.common.config import config
+from bles.core.ble.runtime import get_runtime
 
-def detection_callback(data, device, advertisement_data):
-    name = advertisement_data.local_name or "Nom inconnu"
-    data[device.address] = {
-        "name": name,
-        "address": device.address,
-        "rssi": device.rssi,
-        "manufacturer_data": advertisement_data.manufacturer_data
-    }
 
-async def scan_ble_devices(scan_time=10):
-    print("Scan des dispositifs BLE en cours (5 secondes)...\n")
-    data = {}
-    scanner = BleakScanner(detection_callback=partial(detection_callback, data))
+# scan continu en tâche de fond, voir DeviceDiscovery.start_background
+BACKGROUND_SCAN = bool(os.environ.get("BLES_BACKGROUND_SCAN"))
 
 
-    await scanner.start()
-    await asyncio.sleep(10)
-    await scanner.stop()
+def _normalize(address):
+    return address.upper() if isinstance(address, str) else address
 
 
+class DeviceCache:
+    """
+    Appareils déjà vus (nom, dernier RSSI et historique) persistés en JSON.
+    Les BLEDevice, eux, ne sont gardés qu'en mémoire : ils permettent à
+    BleakClient de se connecter sans refaire de scan.
+    """
+
+    def __init__(self, file=None, history=20):
+        self.file = Path(file) if file else config.app_data_dir / "devices.json"
+        self.history = history
+        self.devices = {}
+        self._ble_devices = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.file.is_file():
+            try:
+                self.devices = json.loads(self.file.read_text())
+            except ValueError:
+                self.devices = {}
+
+    def save(self):
+        with self._lock:
+            text = json.dumps(self.devices, indent=2)
+        self.file.parent.mkdir(exist_ok=True, parents=True)
+        self.file.write_text(text)
+
+    def update(self, device, advertisement_data):
+        address = _normalize(device.address)
+        now = time.time()
+        with self._lock:
+            entry = self.devices.setdefault(address, {"address": device.address, "rssi_history": []})
+            entry["name"] = advertisement_data.local_name or entry.get("name") or "Nom inconnu"
+            entry["rssi"] = advertisement_data.rssi
+            entry["last_seen"] = now
+            entry["rssi_history"] = (entry["rssi_history"] + [[now, advertisement_data.rssi]])[-self.history:]
+            self._ble_devices[address] = device
+            self._seen[address] = time.monotonic()
+        return entry
+
+    def find(self, address, max_age=30):
+        """
+        Appareil vu depuis moins de max_age secondes : son BLEDevice s'il a été
+        vu pendant cette exécution, sinon son adresse s'il est dans le fichier
+        (exécution précédente), None s'il n'a pas été vu récemment.
+        """
+        address = _normalize(address)
+        with self._lock:
+            seen = self._seen.get(address)
+            if seen is not None and time.monotonic() - seen <= max_age:
+                return self._ble_devices[address]
+            entry = self.devices.get(address)
+            if entry and time.time() - entry.get("last_seen", 0) <= max_age:
+                return entry["address"]
+            return None
+
+
+class DeviceDiscovery:
+    """
+    Scan BLE à la demande (arrêté dès que les adresses voulues sont vues) ou
+    en continu, en tâche de fond sur la boucle de runtime.BleRuntime.
+    Les appareils trouvés restent dans le cache : un nouveau démarrage peu
+    après n'a pas à refaire de scan.
+    """
+
+    def __init__(self, cache=None, save_period=30):
+        self.cache = cache or DeviceCache()
+        self.save_period = save_period
+        self._listeners = []
+        self._background = None
+        # scanner du scan continu, None s'il est arrêté ou suspendu (paused)
+        self._background_scanner = None
+        self._paused = 0
+
+    def _on_detection(self, device, advertisement_data):
+        entry = self.cache.update(device, advertisement_data)
+        for listener in list(self._listeners):
+            listener(entry, advertisement_data)
+
+    async def _scanner(self):
+        scanner = BleakScanner(detection_callback=self._on_detection)
+        await scanner.start()
+        return scanner
+
+    async def scan(self, scan_time=10, wanted=None):
+        """
+        :param wanted: adresses attendues, le scan s'arrête dès qu'elles ont toutes été vues
+        :return: {adresse: description} des appareils vus pendant ce scan
+        """
+        wanted = {_normalize(x) for x in wanted or ()}
+        data = {}
+        found = asyncio.Event()
+
+        def _listener(entry, advertisement_data):
+            data[entry["address"]] = dict(entry, manufacturer_data=advertisement_data.manufacturer_data)
+            if wanted and wanted <= {_normalize(x) for x in data}:
+                found.set()
+
+        self._listeners.append(_listener)
+        try:
+            if self._background_scanner is not None:
+                # le scan continu tourne déjà : on se contente d'écouter
+                await asyncio.wait_for(found.wait(), scan_time)
+            else:
+                scanner = await self._scanner()
+                try:
+                    await asyncio.wait_for(found.wait(), scan_time)
+                finally:
+                    await scanner.stop()
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._listeners.remove(_listener)
+        # écriture du fichier hors de la boucle partagée
+        await asyncio.to_thread(self.cache.save)
+        return data
+
+    def find(self, address, max_age=30):
+        return self.cache.find(address, max_age)
+
+    def scan_sync(self, scan_time=10, wanted=None):
+        return get_runtime().submit(self.scan(scan_time, wanted)).result()
+
+    @property
+    def background(self):
+        """Vrai si le scan continu est démarré (même suspendu)"""
+        return self._background is not None and not self._background.done()
+
+    async def _set_scanning(self, scanning):
+        if scanning and self._background_scanner is None and not self._paused:
+            scanner = await self._scanner()
+            if self._paused:
+                # suspendu pendant le démarrage du scanner
+                await scanner.stop()
+            else:
+                self._background_scanner = scanner
+        elif not scanning and self._background_scanner is not None:
+            scanner, self._background_scanner = self._background_scanner, None
+            await scanner.stop()
+
+    async def _run_background(self):
+        try:
+            await self._set_scanning(True)
+            while True:
+                await asyncio.sleep(self.save_period)
+                await asyncio.to_thread(self.cache.save)
+        except (BleakError, OSError) as e:
+            print(f"Scan BLE continu impossible ({e!r})")
+        finally:
+            await self._set_scanning(False)
+            await asyncio.to_thread(self.cache.save)
+
+    def start_background(self):
+        if not self.background:
+            self._background = get_runtime().submit(self._run_background())
+
+    def stop_background(self):
+        if self._background:
+            self._background.cancel()
+            self._background = None
+
+    @contextmanager
+    def paused(self):
+        """Suspend le scan continu (qui occupe l'adaptateur) le temps d'établir des connexions"""
+        runtime = get_runtime()
+        self._paused += 1
+        try:
+            if self.background:
+                runtime.submit(self._set_scanning(False)).result()
+            yield
+        finally:
+            self._paused -= 1
+            if self.background and not self._paused:
+                try:
+                    runtime.submit(self._set_scanning(True)).result()
+                except (BleakError, OSError) as e:
+                    print(f"Reprise du scan BLE continu impossible ({e!r})")
+
+
+_discovery = None
+
+def get_discovery():
+    global _discovery
+    if _discovery is None:
+        _discovery = DeviceDiscovery()
+    return _discovery
+
+
+async def scan_ble_devices(scan_time=10, wanted=None):
+    print(f"Scan des dispositifs BLE en cours ({scan_time} secondes)...\n")
+    data = await get_discovery().scan(scan_time, wanted)
     print(data)
     return data
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Scan des appareils BLE")
+    parser.add_argument("wanted", nargs="*", help="adresses attendues (arrêt dès qu'elles sont vues)")
+    parser.add_argument("-t", "--scan-time", type=float, default=10)
+    args = parser.parse_args()
+    asyncio.run(scan_ble_devices(args.scan_time, args.wanted))
+
+
 if __name__ == "__main__":
-    asyncio.run(scan_ble_devices())
\ No newline at end of file
+    main()
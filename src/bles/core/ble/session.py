@@ -0,0 +1,148 @@
+import argparse
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+from bles.core.ble.fitness import CyclingData
+from bles.core.ble.heart import HRSState
+
+
+def _int(x):
+    return int(float(x))
+
+
+# format -> (séparateur, {colonne: (champ, conversion)}, facteur du temps en secondes)
+FORMATS = {
+    # sortie de bles.app.stats.base.Stat
+    "stat": (";", {
+        "timestamp": ("timestamp", float),
+        "bpm": ("bpm", _int),
+        "power": ("power", _int),
+        "resistance": ("resistance", _int),
+        "speed": ("speed", float),
+        "cadence": ("cadence", float),
+        "distance": ("distance", float),
+    }, 1),
+    # export Elite (voir bles.common.csv_elite), temps en ms et distance en km
+    "elite": (",", {
+        "time": ("timestamp", float),
+        "distance": ("distance", lambda x: float(x) * 1000),
+        "speed": ("speed", float),
+        "power": ("power", _int),
+        "heartrate": ("bpm", _int),
+        "cadence": ("cadence", float),
+    }, 1 / 1000),
+}
+
+CYCLING_FIELDS = ("power", "resistance", "speed", "cadence", "distance")
+
+
+def _columns(line, sep):
+    return [x.strip().replace(" ", "").lower() for x in line.split(sep)]
+
+
+class SessionReader:
+    """
+    Lecture en continu d'une séance enregistrée (CSV de Stat ou export Elite),
+    par paquets de chunk_size lignes : la mémoire utilisée ne dépend pas de la
+    taille du fichier. Les timestamps des lignes sont en secondes depuis le
+    début de la séance.
+    """
+
+    def __init__(self, file, format=None, chunk_size=1024):
+        self.file = Path(file)
+        self.chunk_size = chunk_size
+        with open(self.file) as fd:
+            header = fd.readline()
+            self._data_offset = fd.tell()
+            first = fd.readline()
+
+        self.format = format or ("stat" if ";" in header else "elite")
+        self.sep, columns, self.time_scale = FORMATS[self.format]
+        self._casts = [columns.get(x) for x in _columns(header, self.sep)]
+        if "timestamp" not in [x[0] for x in self._casts if x]:
+            raise ValueError(f"{file} : pas de colonne de temps")
+        self._t0 = self._raw_time(first) if first.strip() else 0
+        self._start_offset = self._data_offset
+
+    def _parse(self, line):
+        ret = {}
+        for cast, value in zip(self._casts, line.split(self.sep)):
+            value = value.strip()
+            if cast is None or not value or value == "None":
+                continue
+            ret[cast[0]] = cast[1](value)
+        return ret
+
+    def _raw_time(self, line):
+        return self._parse(line)["timestamp"] * self.time_scale
+
+    def _row(self, line):
+        row = self._parse(line)
+        row["timestamp"] = row["timestamp"] * self.time_scale - self._t0
+        return row
+
+    def seek(self, timestamp):
+        """Reprend la lecture à la première ligne de timestamp >= timestamp (recherche dichotomique)"""
+        with open(self.file, "rb") as fd:
+            lo, hi = self._data_offset, fd.seek(0, os.SEEK_END)
+            while lo < hi:
+                middle = (lo + hi) // 2
+                # début de la première ligne commençant à middle ou après
+                fd.seek(middle - 1)
+                fd.readline()
+                start = fd.tell()
+                line = fd.readline()
+                if not line.strip() or self._row(line.decode())["timestamp"] >= timestamp:
+                    hi = middle
+                else:
+                    lo = start + len(line)
+        # lo est le début d'une ligne dont le timestamp est >= timestamp
+        self._start_offset = lo
+
+    def chunks(self):
+        with open(self.file) as fd:
+            fd.seek(self._start_offset)
+            while True:
+                lines = list(islice(fd, self.chunk_size))
+                if not lines:
+                    return
+                yield [self._row(x) for x in lines if x.strip()]
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+    def samples(self, feature):
+        """CyclingData ou HRSState pour chaque ligne"""
+        for row in self:
+            yield to_sample(feature, row)
+
+
+def to_sample(feature, row):
+    if feature == "heart_rate":
+        return HRSState(bpm=row.get("bpm", 0), timestamp=row["timestamp"])
+    return CyclingData(timestamp=row["timestamp"], **{k: row[k] for k in CYCLING_FIELDS if k in row})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lecture en continu d'une séance enregistrée")
+    parser.add_argument("file")
+    parser.add_argument("-s", "--seek", type=float, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    reader = SessionReader(args.file, chunk_size=args.chunk_size)
+    reader.seek(args.seek)
+    start = time.perf_counter()
+    count = 0
+    last = None
+    for last in reader.samples("cycling"):
+        count += 1
+    duration = time.perf_counter() - start
+    print(f"{count} lignes ({reader.format}) en {duration:.3f}s, dernière : {last}")
+
+
+if __name__ == '__main__':
+    main()
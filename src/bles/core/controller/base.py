@@ -292,7 +292,9 @@ class BaseController:
         }
 
     def call_function(self, name, kwargs):
-        return getattr(self, name)(**kwargs)
+        ret = getattr(self, name)(**kwargs)
+        self._emit("call", {"name": name, "kwargs": kwargs})
+        return ret
 
     def get_prop(self, name):
         return self._fields[name].get_value()
@@ -303,6 +305,13 @@ class BaseController:
     def set_prop(self, name, value):
         value = self._fields[name].set_value(value)
         self._notify_change(name, value)
+        self._emit("set_prop", {"name": name, "value": value})
+
+    def _emit(self, event, value=None):
+        # évènement publié par le séquenceur (sujet dispatch.CONTROLLER)
+        cb = getattr(self.sequencer, "_on_controller_event", None)
+        if cb is not None:
+            cb(self, event, value)
 
     def _notify_change(self, field, value):
         self._validate()
@@ -325,6 +334,7 @@ class BaseController:
 
         with self._lock:
             self._connected = True
+        self._emit("connect")
 
     def disconnect(self):
         with self._lock:
@@ -335,6 +345,7 @@ class BaseController:
 
         with self._lock:
             self._connected = False
+        self._emit("disconnect")
 
     def send(self, data):
         with self._lock:
@@ -346,10 +357,12 @@ class BaseController:
     def pause(self):
         with self._lock:
             self._pause = True
+        self._emit("pause")
 
     def resume(self):
         with self._lock:
             self._pause = False
+        self._emit("resume")
 
 
     @ControllerFunction()
@@ -1,16 +1,28 @@
-import copy
+import asyncio
 import json
 import threading
 import time
 from abc import ABC, abstractmethod
+from functools import partial
 from pathlib import Path
+from bleak.exc import BleakError
+
 from bles.core.ble import get_ble_client, features
-from bles.common.config import SequencerConfig, config
+from bles.core.ble.runtime import get_runtime
+from bles.core.ble.scan import BACKGROUND_SCAN, get_discovery
+from bles.common.config import SequencerConfig, config, DEFAULT_RIDER
+from bles.common.timer import Time
 from bles.core.controller.base import get_controller, list_controller, BaseController
 from bles.core.driver.base import BaseDriver
+from bles.core.sequencer.dispatch import Dispatcher, DATA, DEVICE, CONTROLLER, ALIGNED
+from bles.core.sequencer.resample import Resampler, has_samples
+from bles.core.sequencer.rider import Rider
 from bles.core.simulator.base_simulator import PowerSimulator, show
+from bles.core.simulator.fitting import load_profile
 from bles.app.stats.base import Stat
 
+# add_handler(..., rider=ANY_RIDER) : tous les cyclistes
+ANY_RIDER = "*"
 
 
 class BaseSequencer(BaseDriver):
@@ -19,10 +31,26 @@ class BaseSequencer(BaseDriver):
     STATUS_RUNNING = "RUNNING"
     STATUS_PAUSED = "PAUSED"
 
+    # délai de connexion par défaut d'un appareil (s), voir SequencerConfig.add_ble_client
+    _connect_timeout_ = 30
+    # un appareil vu par le scan depuis moins de _seen_max_age_ secondes n'est pas recherché à nouveau
+    _seen_max_age_ = 30
+    _scan_time_ = 10
+    # scan continu (BLES_BACKGROUND_SCAN) : les appareils déjà vus ne sont pas recherchés au démarrage
+    _background_scan_ = BACKGROUND_SCAN
+    # file de chaque handler, voir dispatch.Subscriber
+    _dispatch_maxsize_ = 256
+    _dispatch_policy_ = "drop_oldest"
+    # délai laissé aux handlers pour vider leur file à l'arrêt (s)
+    _dispatch_stop_timeout_ = 1
+
     def __init__(self, config=None, on_data_cb=None):
         self._devices = {}
+        # clé : feature pour le cycliste par défaut, "rider/feature" pour les autres
         self._ble_clients = {}
+        self._client_descs = {}
         self._controllers = {}
+        self.riders = {}
         self._thread = None
         self._stopped = threading.Event()
         self._lock = threading.Lock()
@@ -32,28 +60,50 @@ class BaseSequencer(BaseDriver):
 
         self._current_controller = None
         self._simulator = None
-        self._handlers = {}
-        self._on_data_handler = on_data_cb
+        self._simulators = {}
+        # les handlers sont appelés depuis leurs propres threads, jamais depuis la boucle BLE
+        self.dispatcher = Dispatcher(self._dispatch_maxsize_, self._dispatch_policy_)
+        self._on_data_handler = None
+        self.set_on_data_handler(on_data_cb)
         self._last_notify = 0
-        self.data = {}
         self.ready = False
+        self.connection = {}
+
+    def set_on_data_handler(self, cb, **kwargs):
+        if self._on_data_handler is not None:
+            self.dispatcher.unsubscribe(self._on_data_handler)
+        # reçoit uniquement ce que _on_data lui envoie, aucun sujet publié
+        self._on_data_handler = self.dispatcher.subscribe(cb, "on_data", topics=(), **kwargs) if cb else None
+
+    def use_simulator(self, simu, rider=None):
+        """:param rider: simulateur propre à un cycliste, les autres partent d'une copie de celui par défaut"""
+        if isinstance(simu, (str, Path, dict)):
+            # profil issu de bles.core.simulator.fitting
+            simu = load_profile(simu)
+        if rider is None or rider == DEFAULT_RIDER:
+            self._simulator = simu
+        else:
+            self._simulators[rider] = simu
 
-    def set_on_data_handler(self, cb):
-        self._on_data_handler = cb
-
-    def use_simulator(self, simu):
-        self._simulator = simu
+    @property
+    def data(self):
+        rider = self.riders.get(DEFAULT_RIDER)
+        return rider.data if rider else {}
 
     def set_config(self, config):
         self.config = config
 
     @property
     def debug(self):
-        return self._simulator is not None
+        return self._simulator is not None or bool(self._simulators)
 
 
-    def use_controller(self, name):
+    def use_controller(self, name, rider=None):
+        if rider is not None and rider != DEFAULT_RIDER:
+            return self.riders[rider].use_controller(name)
         self._current_controller = self._controllers[name]
+        if DEFAULT_RIDER in self.riders:
+            self.riders[DEFAULT_RIDER].use_controller(name)
         return self._current_controller
 
     def get_controller(self):
@@ -62,84 +112,251 @@ class BaseSequencer(BaseDriver):
     def get_controller_name(self):
         return self._current_controller._name_ if self._current_controller else None
 
+    def _rider_simulator(self, name):
+        simu = self._simulators.get(name)
+        if simu is None and self._simulator is not None:
+            if name != DEFAULT_RIDER and hasattr(self._simulator, "fork"):
+                simu = self._simulators[name] = self._simulator.fork()
+            else:
+                simu = self._simulator
+        return simu
+
+    def _add_client(self, rider, feature, desc, client):
+        key = feature if rider.is_default else f"{rider.name}/{feature}"
+        # le cycliste est lié à l'abonnement : aucune recherche par échantillon
+        get_runtime().subscribe(client, partial(self._on_client_data, rider, key))
+        client.on_disconnect(partial(self._on_client_event, rider, key, feature, "disconnect"))
+        client.on_connect(partial(self._on_client_event, rider, key, feature, "connect"))
+        self._ble_clients[key] = client
+        self._client_descs[key] = (rider, feature, desc)
+        rider.ble_clients[feature] = client
+
     def _connect_devices(self):
         debug = self.debug
-        if debug:
+        riders = self.config.riders
+        self.riders = {
+            name: Rider(name, self, self._rider_simulator(name) if debug else None)
+            for name in riders
+        }
+        if self.config.resample:
+            for rider in self.riders.values():
+                rider.resampler = Resampler(self.config.period, self.config.resample)
 
-            for feature, desc in self.config.ble_clients.items():
-                cls = get_ble_client(feature, True)
-                client = cls(**desc["params"])
-                client.add_handler(self._on_data_wrapper)
-                client.on_disconnect(self._on_disconnect)
-                client.on_connect(self._on_connect)
+        if debug:
 
-                self._ble_clients[feature] = client
-                client.set_debug_simulator(self._simulator)
+            for name, rider_conf in riders.items():
+                rider = self.riders[name]
+                for feature, desc in rider_conf["ble_clients"].items():
+                    cls = get_ble_client(feature, True)
+                    client = cls(**desc["params"])
+                    self._add_client(rider, feature, desc, client)
+                    client.set_debug_simulator(rider.simulator)
         else:
 
             for name, desc in self.config.devices.items():
                 self._devices[name] = desc
 
-            for feature, desc in self.config.ble_clients.items():
-                cls = get_ble_client(feature, False)
-                address = self._devices[desc["device"]]
-                client = cls(address, **desc["params"])
-                client.add_handler(self._on_data_wrapper)
-                client.on_disconnect(self._on_disconnect)
-                client.on_connect(self._on_connect)
+            devices = self._discover_devices()
+            for name, rider_conf in riders.items():
+                rider = self.riders[name]
+                for feature, desc in rider_conf["ble_clients"].items():
+                    cls = get_ble_client(feature, False)
+                    address = self._devices[desc["device"]]
+                    client = cls(devices.get(address) or address, **desc["params"])
+                    self._add_client(rider, feature, desc, client)
 
-                self._ble_clients[feature] = client
 
+        for name, rider_conf in riders.items():
+            for ctrl_name in rider_conf["controllers"]:
+                cls = get_controller(ctrl_name)
+                for x in cls._requires_:
+                    if x not in rider_conf["ble_clients"]:
+                        raise TypeError(f"Aucun client gérant la feature '{x}' n'est disponible ({name})")
 
-        for name, ctrl in self.config.controllers.items():
-            cls = get_controller(name)
-            for x in cls._requires_:
-                if x not in self._ble_clients:
-                    raise TypeError(f"Aucun client gérant la feature '{x}' n'est disponible")
-
+        if debug:
+            self._connect_clients()
+        else:
+            # le scan continu occupe l'adaptateur : suspendu pendant les connexions
+            with get_discovery().paused():
+                self._connect_clients()
+
+        for name, rider_conf in riders.items():
+            rider = self.riders[name]
+            for ctrl_name, ctrl in rider_conf["controllers"].items():
+                cls = get_controller(ctrl_name)
+                missing = [x for x in cls._requires_ if x not in rider.ble_clients]
+                if missing:
+                    print(f"Controller {ctrl_name} ({name}) ignoré, features non connectées: {missing}")
+                    continue
+                rider.controllers[ctrl_name] = cls(rider, **ctrl["params"])
+
+        self.dispatcher.prepare(
+            (DATA, rider.name, feature, key) for key, (rider, feature, desc) in self._client_descs.items()
+        )
+
+        if DEFAULT_RIDER in self.riders:
+            self._controllers = self.riders[DEFAULT_RIDER].controllers
+
+    def _discover_devices(self):
+        """
+        BLEDevice des appareils configurés : ceux vus récemment (scan continu,
+        ou démarrage précédent via le fichier du cache) sont pris dans le
+        cache, les autres cherchés par un seul scan arrêté dès qu'ils sont
+        tous trouvés. Si le scan échoue (pas d'adaptateur...), les clients se
+        connectent par adresse et _connect_clients applique la politique
+        required / optionnel.
+        """
+        discovery = get_discovery()
+        if self._background_scan_:
+            discovery.start_background()
+        addresses = [x for x in self._devices.values() if isinstance(x, str)]
+        missing = [x for x in addresses if discovery.find(x, self._seen_max_age_) is None]
+        if missing:
+            try:
+                discovery.scan_sync(self._scan_time_, missing)
+            except (BleakError, OSError, asyncio.TimeoutError) as e:
+                print(f"Scan BLE impossible ({e!r}), appareils du cache uniquement")
+
+        ret = {}
+        for address in addresses:
+            device = discovery.find(address, self._seen_max_age_)
+            if device is not None:
+                ret[address] = device
+        return ret
+
+    def _connect_clients(self):
+        """
+        Connecte tous les clients en parallèle, chacun avec son délai. Un
+        client optionnel qui ne se connecte pas est arrêté et retiré, un
+        client requis fait échouer le démarrage.
+        """
+        start = time.monotonic()
         for name, ble in self._ble_clients.items():
             print(f"Connecting {name} ...")
             ble.run_thread()
-            #
-            # for name, ble in self._ble_clients.items():
-            if not ble.wait_for_connection(None):
-                raise TimeoutError(f"Name={name}")
-            print(f"{name}  connected !...")
 
-        for name, ctrl in self.config.controllers.items():
-            cls = get_controller(name)
-            controller = cls(self, **ctrl["params"])
-            self._controllers[name] = controller
+        devices = {}
+        failed = []
+        for name, ble in list(self._ble_clients.items()):
+            rider, feature, desc = self._client_descs[name]
+            timeout = desc.get("timeout")
+            if timeout is None:
+                timeout = self._connect_timeout_
+            connected = ble.wait_for_connection(max(0, start + timeout - time.monotonic()))
+            devices[name] = {
+                "connected": connected,
+                "required": desc.get("required", True),
+                "duration": ble.connect_duration,
+            }
+            if connected:
+                print(f"{name}  connected !...")
+            else:
+                print(f"{name} : pas de connexion après {timeout}s")
+                failed.append(name)
+
+        for name in failed:
+            ble = self._ble_clients.pop(name)
+            rider, feature, desc = self._client_descs[name]
+            rider.ble_clients.pop(feature, None)
+            ble.abort()
+            ble.join()
 
+        self.connection = {
+            "duration": time.monotonic() - start,
+            "devices": devices,
+        }
 
+        required = [x for x in failed if devices[x]["required"]]
+        if required:
+            for ble in self._ble_clients.values():
+                ble.stop()
+            for ble in self._ble_clients.values():
+                ble.join()
+            self._ble_clients = {}
+            raise TimeoutError(f"Appareils requis non connectés: {required}")
 
-    def get_client(self, feature):
-        return self._ble_clients[feature]
 
 
+    def get_client(self, feature, rider=None):
+        if rider is not None and rider != DEFAULT_RIDER:
+            return self.riders[rider].get_client(feature)
+        return self._ble_clients[feature]
 
-    def add_handler(self, fct, feature=None):
+    def get_rider(self, name=DEFAULT_RIDER):
+        return self.riders[name]
+
+    def add_handler(self, fct, feature=None, rider=None, device=None, controller=None, event=DATA, **kwargs):
+        """
+        Abonne fct à un sujet :
+            event=DATA : échantillons, fct(feature, données)
+            event=DEVICE : (dé)connexions, fct(feature, "connect" | "disconnect")
+            event=CONTROLLER : évènements des controllers, fct(nom, évènement, valeur)
+            event=ALIGNED : flux rééchantillonné, fct(rider, point) (voir resample.Resampler)
+
+        :param feature: feature ou liste de features, None : toutes
+        :param rider: cycliste (par défaut : cycliste par défaut), ANY_RIDER : tous
+        :param device: clé de l'appareil dans get_status()["devices"]
+        :param controller: nom du controller (event=CONTROLLER)
+        :param kwargs: maxsize, policy... de la file du handler (voir dispatch.Subscriber)
+        :return: dispatch.Subscriber, sub.unsubscribe() pour se désabonner
+        """
         if feature is None or isinstance(feature, str):
             feature = [feature]
+        if event == CONTROLLER:
+            feature = [controller]
+
+        rider = None if rider == ANY_RIDER else rider or DEFAULT_RIDER
+        topics = [(event, rider, f, device) for f in feature]
+        return self.dispatcher.subscribe(fct, topics=topics, **kwargs)
+
+    def remove_handler(self, sub):
+        sub.unsubscribe()
+
+    def _on_client_data(self, rider, key, feature, data):
+        # copie sur écriture : rider.data n'est jamais modifié sur place, un
+        # consommateur peut garder la référence reçue sans la copier
+        rider.store(feature, data)
+        if rider.is_default and rider.resampler is None:
+            self._on_data(feature, data)
+        self.dispatcher.publish((DATA, rider.name, feature, key), feature, data)
+
+    def _on_aligned(self, rider, point):
+        rider.store_aligned(point)
+        if rider.is_default and self._on_data_handler is not None and has_samples(point):
+            # l'API reçoit un point par période plutôt que chaque notification
+            self.dispatcher.send(self._on_data_handler, None, point)
+        self.dispatcher.publish((ALIGNED, rider.name, None, None), rider.name, point)
+
+    def _resample(self):
+        """Produit les points échus de chaque cycliste, retourne le délai avant le suivant"""
+        wait = None
+        for rider in self.riders.values():
+            resampler = rider.resampler
+            if resampler is None:
+                continue
+            if not resampler.started:
+                resampler.start()
+            for point in resampler.due():
+                self._on_aligned(rider, point)
+            wait = resampler.wait_time() if wait is None else min(wait, resampler.wait_time())
+        return wait
 
-        for f in feature:
-            self._handlers[f] = fct
+    def _on_data_wrapper(self, feature, data):
+        self._on_client_data(self.riders[DEFAULT_RIDER], feature, feature, data)
 
-    def _store_data(self, feature, data):
-        with self.data_lock:
-            self.data[feature] = copy.copy(data)
+    def _on_client_event(self, rider, key, feature, event, client):
+        if event == "connect":
+            self._on_connect(client)
+        else:
+            self._on_disconnect(client)
+        self.dispatcher.publish((DEVICE, rider.name, feature, key), feature, event)
 
-    def _on_data_wrapper(self, feature, data):
-        self._store_data(feature, data)
-        self._on_data(feature, data)
-        if feature in self._handlers:
-            self._handlers[feature](feature, data)
-        if None in self._handlers:
-            self._handlers[None](feature, data)
+    def _publish_controller_event(self, rider, controller, event, value):
+        self.dispatcher.publish((CONTROLLER, rider.name, controller._name_, None), controller._name_, event, value)
 
     def _on_data(self, feature, data):
-        if self._on_data_handler:
-            self._on_data_handler(feature, self.data)
+        if self._on_data_handler is not None:
+            self.dispatcher.send(self._on_data_handler, feature, self.data)
 
     def _on_connect(self, client):
         pass
@@ -150,6 +367,8 @@ class BaseSequencer(BaseDriver):
     def start(self):
         print("----------------", self._thread)
         assert not self._thread
+        self._stopped.clear()
+        self.dispatcher.start()
         self._thread = threading.Thread(target=self.run, args=())
         self._thread.start()
 
@@ -177,20 +396,29 @@ class BaseSequencer(BaseDriver):
             ble.join()
 
         self._ble_clients = {}
+        self._client_descs = {}
 
 
-        for name, ctrl in self._controllers.items():
-            ctrl.disconnect()
+        for rider in self.riders.values():
+            for name, ctrl in rider.controllers.items():
+                ctrl.disconnect()
+            rider.controllers = {}
         self._controllers = {}
 
         with self._lock:
-            if self.status in (self.STATUS_PAUSED, self.STATUS_RUNNING):
+            running = self.status in (self.STATUS_PAUSED, self.STATUS_RUNNING)
+            if running:
                 self._stopped.set()
-                self.status = self.STATUS_IDLE
 
         if self._thread:
             self.join()
 
+        # plus rien n'est publié : les handlers finissent leur file avant IDLE
+        self.dispatcher.stop(self._dispatch_stop_timeout_)
+        with self._lock:
+            if running:
+                self.status = self.STATUS_IDLE
+
 
     def set_prop(self, name, value):
         if self._current_controller is None:
@@ -231,7 +459,7 @@ class BaseSequencer(BaseDriver):
         self.ready = True
         self.status = self.STATUS_RUNNING
         while not self._stopped.is_set():
-            self._stopped.wait()
+            self._stopped.wait(self._resample())
         self.ready = False
 
 
@@ -267,6 +495,7 @@ class ControllableSequencer(BaseSequencer):
     def get_status(self):
         return {
             "instant_data": self.data,
+            "aligned": self.riders[DEFAULT_RIDER].aligned if DEFAULT_RIDER in self.riders else {},
             "devices": {
                 k: v.get_status() for k, v in self._ble_clients.items()
             },
@@ -274,7 +503,13 @@ class ControllableSequencer(BaseSequencer):
                 k: v.get_status() for k, v in self._controllers.items()
             },
             "status": self.status,
-            "current_controller" : self._current_controller and self._current_controller._name_
+            "runtime": get_runtime().get_status(),
+            "connection": self.connection,
+            "dispatch": self.dispatcher.get_status(),
+            "current_controller" : self._current_controller and self._current_controller._name_,
+            "riders": {
+                k: v.get_status() for k, v in self.riders.items() if not v.is_default
+            },
         }
 
 
@@ -284,7 +519,7 @@ def set_power(self, power, duration):
     print(f"Setting power to {power} for {duration} s")
     ctrl = self.use_controller("power")
     ctrl.set_prop("power", power)
-    time.sleep(duration)
+    Time.sleep(duration)
 
 
 def debug():
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import threading
+import time
+from collections import deque
+
+from bles.core.ble.base import LatencyStats
+
+# politique quand la file d'un abonné est pleine
+DROP_OLDEST = "drop_oldest"   # on jette le plus ancien élément en attente
+# l'émetteur attend (au plus block_timeout secondes), sauf s'il tourne dans
+# une boucle asyncio (clients BLE) : il ne doit jamais la bloquer, on jette
+# alors le plus ancien comme DROP_OLDEST
+BLOCK = "block"
+SAMPLE = "sample"             # on ne garde que le dernier élément de chaque clé
+
+POLICIES = (DROP_OLDEST, BLOCK, SAMPLE)
+
+# sujets publiés par le séquenceur : (type, rider, feature ou controller, appareil)
+DATA = "data"
+DEVICE = "device"
+CONTROLLER = "controller"
+ALIGNED = "aligned"
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def match(topic, pattern):
+    """None dans le filtre : n'importe quelle valeur"""
+    return len(topic) == len(pattern) and all(p is None or p == t for t, p in zip(topic, pattern))
+
+
+class Subscriber:
+    """
+    Abonné du Dispatcher : file bornée vidée par son propre thread, un
+    consommateur lent (CSV, Tk...) ne ralentit ni l'émetteur ni les autres.
+    Avec SAMPLE, key(args) regroupe les éléments : seul le dernier de chaque
+    clé est conservé (par défaut la clé est le premier argument, la feature).
+    topics : filtres des sujets reçus (voir match), None : tous les sujets.
+    """
+
+    def __init__(self, fct, name=None, maxsize=256, policy=DROP_OLDEST, key=None, block_timeout=1, topics=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Politique inconnue : {policy}")
+        self.fct = fct
+        self.name = name or getattr(fct, "__qualname__", repr(fct))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key or (lambda args: args[0] if args else None)
+        self.block_timeout = block_timeout
+        self.topics = None if topics is None else [tuple(x) for x in topics]
+        self.dispatcher = None
+        self._queue = deque()
+        self._pending = {}
+        self._cond = threading.Condition()
+        # arrêté tant que start() n'a pas été appelé : rien n'est mis en file
+        self._stopped = True
+        self._thread = None
+        self._generation = 0
+
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_size = 0
+        self.blocked = 0.0
+        self.lag = LatencyStats()
+
+    def start(self):
+        with self._cond:
+            if self._thread:
+                return
+            self._stopped = False
+            self._generation += 1
+            self._thread = threading.Thread(target=self._run, args=(self._generation,),
+                                            name=f"dispatch-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Laisse au plus `timeout` secondes pour livrer ce qui est en file, puis jette le reste"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+        with self._cond:
+            self.dropped += len(self._queue)
+            self._queue.clear()
+            self._pending.clear()
+            # un thread encore occupé s'arrêtera après son élément en cours
+            self._generation += 1
+            self._thread = None
+
+    def unsubscribe(self):
+        if self.dispatcher is not None:
+            self.dispatcher.unsubscribe(self)
+
+    def accepts(self, topic):
+        return self.topics is None or any(match(topic, x) for x in self.topics)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, args, created=None):
+        created = time.perf_counter() if created is None else created
+        with self._cond:
+            if self._stopped:
+                return
+            self.received += 1
+            if self.policy == SAMPLE:
+                key = self.key(args)
+                if key in self._pending:
+                    # l'élément en attente est remplacé, sa place dans la file est gardée
+                    self.dropped += 1
+                    self._pending[key] = (args, created)
+                    return
+                if len(self._queue) >= self.maxsize:
+                    self._drop_oldest()
+                self._pending[key] = (args, created)
+                self._queue.append(key)
+            else:
+                if len(self._queue) >= self.maxsize:
+                    if self.policy == BLOCK and not _on_event_loop():
+                        start = time.perf_counter()
+                        self._cond.wait_for(lambda: len(self._queue) < self.maxsize or self._stopped,
+                                            self.block_timeout)
+                        self.blocked += time.perf_counter() - start
+                    if len(self._queue) >= self.maxsize:
+                        self._drop_oldest()
+                self._queue.append((args, created))
+            self.max_size = max(self.max_size, len(self._queue))
+            self._cond.notify_all()
+
+    def _drop_oldest(self):
+        item = self._queue.popleft()
+        if self.policy == SAMPLE:
+            self._pending.pop(item)
+        self.dropped += 1
+
+    def _get(self, generation):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._stopped or generation != self._generation)
+            if not self._queue or generation != self._generation:
+                return None
+            item = self._queue.popleft()
+            if self.policy == SAMPLE:
+                item = self._pending.pop(item)
+            # place libérée pour un émetteur bloqué
+            self._cond.notify_all()
+            return item
+
+    def _run(self, generation):
+        while True:
+            item = self._get(generation)
+            if item is None:
+                return
+            args, created = item
+            try:
+                self.fct(*args)
+            except Exception as e:
+                self.errors += 1
+                print(f"Erreur dans l'abonné {self.name} : {e!r}")
+            self.delivered += 1
+            self.lag.add(time.perf_counter() - created)
+
+    def get_status(self):
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "size": len(self._queue),
+            "max_size": self.max_size,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "blocked": self.blocked,
+            "lag": self.lag.to_json(),
+        }
+
+
+class Dispatcher:
+    """
+    Diffusion d'échantillons vers des abonnés, chacun avec sa file bornée et
+    son thread. publish() ne fait que déposer dans les files : elle peut
+    être appelée depuis la boucle BLE.
+    Les abonnés de chaque sujet sont calculés une fois puis gardés dans une
+    table, vidée à chaque (dés)abonnement : publier ne coûte que le nombre
+    d'abonnés intéressés.
+    Les threads des abonnés ne tournent qu'entre start() et stop().
+    """
+
+    def __init__(self, maxsize=256, policy=DROP_OLDEST):
+        self.maxsize = maxsize
+        self.policy = policy
+        # copie sur écriture : publish() parcourt la liste sans verrou
+        self._subscribers = ()
+        self._table = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self.published = 0
+
+    def subscribe(self, fct, name=None, maxsize=None, policy=None, **kwargs):
+        sub = Subscriber(fct, name, maxsize or self.maxsize, policy or self.policy, **kwargs)
+        sub.dispatcher = self
+        with self._lock:
+            if sub.name in {x.name for x in self._subscribers}:
+                # noms uniques pour get_status
+                sub.name = f"{sub.name}#{len(self._subscribers)}"
+            if self._running:
+                sub.start()
+            self._subscribers = self._subscribers + (sub,)
+            self._table = {}
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers = tuple(x for x in self._subscribers if x is not sub)
+            self._table = {}
+        sub.stop()
+
+    def lookup(self, topic):
+        """Abonnés intéressés par topic"""
+        subs = self._table.get(topic)
+        if subs is None:
+            with self._lock:
+                subs = tuple(x for x in self._subscribers if x.accepts(topic))
+                table = dict(self._table)
+                table[topic] = subs
+                self._table = table
+        return subs
+
+    def prepare(self, topics):
+        """Précalcule la table pour des sujets connus"""
+        for topic in topics:
+            self.lookup(topic)
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def publish(self, topic, *args):
+        created = time.perf_counter()
+        self.published += 1
+        for sub in self.lookup(topic):
+            sub.put(args, created)
+
+    def send(self, sub, *args):
+        """Dépose dans la file d'un seul abonné"""
+        self.published += 1
+        sub.put(args)
+
+    def start(self):
+        with self._lock:
+            self._running = True
+            subscribers = self._subscribers
+        for sub in subscribers:
+            sub.start()
+
+    def stop(self, timeout=None):
+        """Arrête les threads, les abonnements sont gardés pour le prochain start()"""
+        with self._lock:
+            self._running = False
+            subscribers = self._subscribers
+        for sub in subscribers:
+            sub.stop(timeout)
+
+    def get_status(self):
+        return {
+            "published": self.published,
+            "topics": len(self._table),
+            "subscribers": {x.name: x.get_status() for x in self._subscribers},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diffusion vers un abonné lent et un abonné rapide")
+    parser.add_argument("-n", "--count", type=int, default=10000)
+    parser.add_argument("--slow", type=float, default=0.01, help="durée de traitement de l'abonné lent (s)")
+    parser.add_argument("-p", "--policy", choices=POLICIES, default=DROP_OLDEST)
+    parser.add_argument("--maxsize", type=int, default=64)
+    parser.add_argument("--others", type=int, default=50, help="abonnés à d'autres cyclistes (non concernés)")
+    args = parser.parse_args()
+
+    dispatcher = Dispatcher(args.maxsize, args.policy)
+    dispatcher.start()
+    dispatcher.subscribe(lambda feature, data: None, "fast")
+    dispatcher.subscribe(lambda feature, data: time.sleep(args.slow), "slow")
+    for i in range(args.others):
+        dispatcher.subscribe(lambda feature, data: None, f"rider{i}", topics=[(DATA, f"rider{i}", None, None)])
+
+    start = time.perf_counter()
+    for i in range(args.count):
+        feature = "cycling" if i % 2 else "heart_rate"
+        dispatcher.publish((DATA, "default", feature, feature), feature, i)
+    duration = time.perf_counter() - start
+    time.sleep(0.5)
+    print(f"{args.count} publications en {duration * 1000:.1f}ms ({duration / args.count * 1e6:.1f}us/publication)")
+    for name, status in list(dispatcher.get_status()["subscribers"].items())[:2]:
+        print(f"  {name}: {status}")
+    dispatcher.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import bisect
+import dataclasses
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from bles.common.timer import Time
+
+HOLD = "hold"       # dernière valeur connue
+LINEAR = "linear"   # interpolation entre les échantillons encadrant le point
+
+METHODS = (HOLD, LINEAR)
+
+# champs des échantillons qui ne sont pas des mesures
+_META = ("timestamp", "seq", "monotonic", "gap")
+
+_fields_cache = {}
+
+
+def _fields(cls):
+    ret = _fields_cache.get(cls)
+    if ret is None:
+        ret = _fields_cache[cls] = [x.name for x in dataclasses.fields(cls) if x.name not in _META]
+    return ret
+
+
+def interpolate(a, b, w):
+    """Échantillon entre a (w=0) et b (w=1), les champs entiers restent entiers"""
+    changes = {}
+    for name in _fields(type(a)):
+        x, y = getattr(a, name), getattr(b, name)
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)) and not isinstance(x, bool):
+            v = x + (y - x) * w
+            changes[name] = round(v) if isinstance(x, int) else v
+    return dataclasses.replace(a, **changes)
+
+
+def resample(times, values, grid, method=HOLD, max_age=None):
+    """
+    Forme vectorisée : valeurs (n,) ou (n, k) mesurées aux instants `times`
+    (croissants) ramenées sur les instants `grid`.
+
+    :return: (valeurs sur la grille, stale) ; stale est vrai avant le premier
+        échantillon (valeur NaN) et quand le dernier échantillon a plus de max_age secondes
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    if not len(times):
+        out = np.full((len(grid), values.shape[1]), np.nan)
+        stale = np.ones(len(grid), dtype=bool)
+        return (out[:, 0] if squeeze else out), stale
+
+    idx = np.searchsorted(times, grid, side="right") - 1
+    valid = idx >= 0
+    i0 = np.maximum(idx, 0)
+    out = values[i0]
+    if method == LINEAR:
+        i1 = np.minimum(i0 + 1, len(times) - 1)
+        dt = times[i1] - times[i0]
+        # après le dernier échantillon i1 == i0 : valeur maintenue
+        w = np.divide(grid - times[i0], dt, out=np.zeros_like(grid), where=dt > 0)
+        out = out + (values[i1] - values[i0]) * np.clip(w, 0, 1)[:, None]
+    out = np.where(valid[:, None], out, np.nan)
+
+    stale = ~valid
+    if max_age is not None:
+        stale |= grid - times[i0] > max_age
+    return (out[:, 0] if squeeze else out), stale
+
+
+class Resampler:
+    """
+    Rééchantillonnage en direct des flux d'un cycliste sur une grille de
+    `period` secondes (temps de séance, qui suit Time.clock). Les échantillons
+    sont placés sur la grille d'après leur champ `monotonic`.
+
+    Chaque point est un dict {"timestamp", "index", "stale", feature: échantillon}
+    où timestamp est l'instant de la grille (Time.time() au start() + index * period),
+    index le numéro du point depuis start() et stale la liste des features sans échantillon depuis plus de max_age secondes.
+    En linéaire, un point n'est produit qu'après `delay` secondes (une
+    période par défaut) pour attendre l'échantillon suivant.
+    """
+
+    def __init__(self, period=1, method=HOLD, max_age=None, delay=None, history=4096):
+        if method not in METHODS:
+            raise ValueError(f"Méthode de rééchantillonnage inconnue : {method}")
+        self.period = period
+        self.method = method
+        self.max_age = 3 * period if max_age is None else max_age
+        self.delay = (period if method == LINEAR else 0) if delay is None else delay
+        self._history = history
+        # feature -> deque[(monotonic, échantillon)]
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._start = None
+        self._start_time = 0
+        self._speed = 1
+        self.index = 0
+        self.stale_points = 0
+
+    def start(self, now=None, start_time=None):
+        self._start = time.monotonic() if now is None else now
+        self._start_time = Time.time() if start_time is None else start_time
+        self._speed = 1 / Time.clock.scale(1)
+        self.index = 0
+
+    @property
+    def started(self):
+        return self._start is not None
+
+    def _time(self, monotonic):
+        return (monotonic - self._start) * self._speed
+
+    def _monotonic(self, t):
+        return self._start + t / self._speed
+
+    def push(self, feature, data):
+        with self._lock:
+            samples = self._samples.get(feature)
+            if samples is None:
+                samples = self._samples[feature] = deque(maxlen=self._history)
+            samples.append((data.monotonic, data))
+
+    def wait_time(self, now=None):
+        """Durée réelle avant le prochain point de la grille"""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._monotonic(self.index * self.period + self.delay) - now)
+
+    def due(self, now=None):
+        """Points de la grille échus depuis le dernier appel"""
+        if self._start is None:
+            return []
+        now = self._time(time.monotonic() if now is None else now)
+        ret = []
+        while self.index * self.period + self.delay <= now:
+            ret.append(self.sample_at(self.index))
+            self.index += 1
+        return ret
+
+    def sample_at(self, index):
+        t = index * self.period
+        limit = self._monotonic(t)
+        timestamp = self._start_time + t
+        ret = {"timestamp": timestamp, "index": index, "stale": []}
+        with self._lock:
+            for feature, samples in self._samples.items():
+                i = bisect.bisect_right(samples, limit, key=lambda x: x[0])
+                if i == 0:
+                    ret["stale"].append(feature)
+                    continue
+                t0, value = samples[i - 1]
+                if self.method == LINEAR and i < len(samples):
+                    t1, after = samples[i]
+                    value = interpolate(value, after, (limit - t0) / (t1 - t0) if t1 > t0 else 0)
+                if t - self._time(t0) > self.max_age:
+                    ret["stale"].append(feature)
+                ret[feature] = dataclasses.replace(value, timestamp=timestamp)
+                # la grille avance : les échantillons antérieurs ne servent plus
+                for _ in range(i - 1):
+                    samples.popleft()
+        if ret["stale"]:
+            self.stale_points += 1
+        return ret
+
+    def get_status(self):
+        return {
+            "period": self.period,
+            "method": self.method,
+            "points": self.index,
+            "stale_points": self.stale_points,
+        }
+
+
+def has_samples(point):
+    """Vrai si le point porte au moins une feature à jour"""
+    return any(k not in point["stale"] for k in point if k not in ("timestamp", "index", "stale"))
+
+
+def main():
+    from bles.core.ble.session import SessionReader
+
+    parser = argparse.ArgumentParser(description="Rééchantillonne une séance enregistrée sur une grille régulière")
+    parser.add_argument("file")
+    parser.add_argument("-p", "--period", type=float, default=1)
+    parser.add_argument("-m", "--method", choices=METHODS, default=HOLD)
+    parser.add_argument("--max-age", type=float, default=None)
+    args = parser.parse_args()
+
+    rows = list(SessionReader(args.file))
+    start = time.perf_counter()
+    names = sorted({k for row in rows for k in row} - {"timestamp"})
+    times = np.array([row["timestamp"] for row in rows])
+    values = np.array([[row.get(k, np.nan) for k in names] for row in rows])
+    grid = np.arange(times[0], times[-1], args.period) if len(times) else np.array([])
+    out, stale = resample(times, values, grid, args.method, args.max_age)
+    duration = time.perf_counter() - start
+    print(f"{len(rows)} lignes -> {len(grid)} points ({args.method}, {args.period}s) en {duration * 1000:.1f}ms"
+          f", {int(stale.sum())} points périmés")
+    for name, column in zip(names, out.T):
+        print(f"  {name}: moyenne {np.nanmean(column):.1f}" if len(column) else f"  {name}: -")
+
+
+if __name__ == '__main__':
+    main()
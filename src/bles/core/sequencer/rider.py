@@ -0,0 +1,82 @@
+import threading
+
+from bles.common.config import DEFAULT_RIDER
+from bles.core.ble import features
+from bles.core.sequencer.resample import has_samples
+
+
+class Rider:
+    """
+    Groupe d'appareils d'un cycliste dans une séance : ses clients BLE (un par
+    feature), ses controllers et ses dernières données.
+    Sert de `sequencer` à ses controllers (get_client, évènements).
+    """
+
+    def __init__(self, name, sequencer, simulator=None):
+        self.name = name
+        self.sequencer = sequencer
+        self.simulator = simulator
+        self.ble_clients = {}
+        self.controllers = {}
+        self.current_controller = None
+        self.data = {}
+        # dernier point du flux rééchantillonné, voir resample.Resampler
+        self.resampler = None
+        self.aligned = {}
+        self.stats = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_default(self):
+        return self.name == DEFAULT_RIDER
+
+    def get_client(self, feature):
+        return self.ble_clients[feature]
+
+    def use_controller(self, name):
+        self.current_controller = self.controllers[name]
+        self._on_controller_event(self.current_controller, "use", None)
+        return self.current_controller
+
+    def _on_controller_event(self, controller, event, value):
+        self.sequencer._publish_controller_event(self, controller, event, value)
+
+    def enable_stats(self):
+        """Enregistre les données du cycliste dans un Stat dédié"""
+        from bles.app.stats.base import Stat
+        if self.stats is None:
+            self.stats = Stat(None if self.is_default else self.name)
+        return self.stats
+
+    def store(self, feature, data):
+        # copie sur écriture, par cycliste : pas de verrou commun à toute la séance
+        with self._lock:
+            data_map = dict(self.data)
+            data_map[feature] = data
+            self.data = data_map
+        if self.resampler is not None:
+            self.resampler.push(feature, data)
+        elif self.stats is not None and (feature == features.cycling or features.cycling not in self.ble_clients):
+            self.stats.append(data_map)
+        return data_map
+
+    def store_aligned(self, point):
+        self.aligned = point
+        # les points sans aucune donnée (avant la connexion...) ne sont pas enregistrés
+        if self.stats is not None and has_samples(point):
+            self.stats.append(point)
+
+    def add_handler(self, fct, feature=None, **kwargs):
+        return self.sequencer.add_handler(fct, feature, self.name, **kwargs)
+
+    def get_status(self):
+        return {
+            "instant_data": self.data,
+            "devices": list(self.ble_clients),
+            "controllers": {
+                k: v.get_status() for k, v in self.controllers.items()
+            },
+            "current_controller": self.current_controller and self.current_controller._name_,
+            "aligned": self.aligned,
+            "resample": self.resampler and self.resampler.get_status(),
+        }
@@ -1,11 +1,15 @@
+import copy
 import math
 import random
 from collections import namedtuple
+from functools import partial
 
 import numpy as np
 from matplotlib import pyplot as plt
 
 from bles.common.csv_elite import read_csv_elite
+from bles.core.simulator.curves import curve_table
+from bles.core.simulator.history import RingBuffer
 from bles.playground import functions
 from bles.playground.functions import exp_cb
 from tests import TEST_DATA
@@ -18,25 +22,30 @@ def show(X, *Yn):
 
 
 def f(x, k=100, base=10):
-    x = np.clip(x, 0,1)
-    ret =  math.log(1+( k-x*k), base) / math.log(1+k, base)
-    return  ret
+    return curve_table("log_decreasing", k, base)(x)
 
 
 def fb(x, k=1, base=2):
-    x = np.clip(x, 0,1)
-    ret =  math.log(1+(x*k), base) / math.log(1+k, base)
-    return  ret
+    return curve_table("log_increasing", k, base)(x)
 
 def f2(x, k=100, base=2):
-    x = np.clip(x, 0,1)
-    ret = math.log(1+( x*k), base) / math.log(1+k, base)
-    return  ret
+    return curve_table("log_increasing", k, base)(x)
 
 def f2b(x, k=0.05, base=2):
-    x = np.clip(x, 0,1)
-    ret = 1 - math.log(1+( x*k), base) / math.log(1+k, base)
-    return  1-x
+    return  1 - min(max(x, 0), 1)
+
+
+# Versions tableau de f / f2 / f2b
+def f_array(x, k=100, base=10):
+    return curve_table("log_decreasing", k, base).array(x)
+
+
+def f2_array(x, k=100, base=2):
+    return curve_table("log_increasing", k, base).array(x)
+
+
+def f2b_array(x, k=0.05, base=2):
+    return 1 - np.clip(x, 0, 1)
 
 
 
@@ -119,10 +128,48 @@ class Zone:
 
         return ret, self.last
 
+    def effort_array(self, x):
+        raise NotImplementedError()
+
+    def consume_array(self, x):
+        """
+        Equivalent de consume() appliqué à toute une série de puissances.
+        La capacité ne fait que décroître : la consommation cumulée est
+        simplement la somme cumulée des débits, plafonnée à la capacité.
+        """
+        x = np.asarray(x, dtype=float)
+        if not len(x):
+            return np.zeros(0), np.zeros(0)
+        used = np.minimum(np.cumsum(np.minimum(x, self.debit_max)), self.capacite)
+        consumed = np.diff(used, prepend=0.0)
+        capacite = self.capacite - (used - consumed)
+
+        maxi = np.minimum(capacite, self.debit_max)
+        ret = np.maximum(0, x - maxi)
+        effort = consumed / np.maximum(maxi, 1)
+        last = self.effort_array(effort) * self.zone_fc_range
+
+        self.capacite -= used[-1]
+        self.last = float(last[-1])
+        self.last_effort = float(effort[-1])
+        return ret, last
+
     @property
     def left(self):
         return self.capacite / self.capacite_max
 
+    def snapshot(self):
+        return {
+            "capacite": self.capacite,
+            "last": self.last,
+            "last_effort": self.last_effort,
+        }
+
+    def restore(self, state):
+        self.capacite = state["capacite"]
+        self.last = state["last"]
+        self.last_effort = state["last_effort"]
+
 
 class Zone1(Zone):
     bpm_ratio_working = [0, 0.7] #[0.5, 0.7]
@@ -130,16 +177,25 @@ class Zone1(Zone):
         x = max(x, 0.5)
         return x # functions.exp_opp(x)
 
+    def effort_array(self, x):
+        return np.maximum(x, 0.5)
+
 class Zone2(Zone):
     bpm_ratio_working = [0.68, 0.9]
     def effort(self, x):
         return x
 
+    def effort_array(self, x):
+        return x
+
 class Zone3(Zone):
     bpm_ratio_working = [0.88, 1]
     def effort(self, x):
         return x
 
+    def effort_array(self, x):
+        return x
+
 
 
 class PowerSimulator(BaseSimulator):
@@ -148,7 +204,7 @@ class PowerSimulator(BaseSimulator):
     Result = namedtuple("Result", ["bpm", "power"])
 
     def __init__(self, min_freq = 55, max_freq=187, pma=200,
-                 init_freq=None):
+                 init_freq=None, history=3600, spill=None):
         self.min_freq = min_freq
         self._time = 0
         self.max_freq = max_freq
@@ -164,10 +220,26 @@ class PowerSimulator(BaseSimulator):
 
 
 
-        self._bpms = []
-        self._effective_power = []
-        self._target_power = []
-        self._effort_charge = []
+        self._init_history(history, spill)
+
+    def _init_history(self, history, spill):
+        # historique borné aux `history` dernières secondes, spill(nom, valeurs)
+        # reçoit les valeurs plus anciennes (cf. history.FileSpill)
+        self._bpms = self._create_history("bpms", history, spill)
+        self._effective_power = self._create_history("effective_power", history, spill)
+        self._target_power = self._create_history("target_power", history, spill)
+        self._effort_charge = self._create_history("effort_charge", history, spill)
+
+    def _create_history(self, name, history, spill):
+        return RingBuffer(history, spill=spill and partial(spill, name))
+
+    @property
+    def _zones(self):
+        return self._z1, self._z2, self._z3
+
+    def flush_history(self):
+        for x in (self._bpms, self._effective_power, self._target_power, self._effort_charge):
+            x.flush()
 
 
 
@@ -184,6 +256,10 @@ class PowerSimulator(BaseSimulator):
             last_bpm = self.init_freq
         return last_bpm
 
+    def _current_bpm(self):
+        # comme last_bpm mais sans tirer init_freq : None tant qu'elle n'est pas fixée
+        return self._bpms[-1] if self._bpms else self.init_freq
+
     def _step(self, target_power):
         self._time += 1
         effective_power = target_power
@@ -201,8 +277,13 @@ class PowerSimulator(BaseSimulator):
         #     self._z2.recup(recup)
 
         target_bpm = self.min_freq + bpm3 + bpm1 + bpm2
-        last_bpm = self.last_bpm
+        bpm = self._next_bpm(self.last_bpm, target_bpm)
+        self._bpms.append(bpm)
+        self._effective_power.append(effective_power)
+
+        return bpm
 
+    def _next_bpm(self, last_bpm, target_bpm):
         diff = (target_bpm - last_bpm)
         diff_rel = abs(diff) / self.range_fc
 
@@ -221,11 +302,7 @@ class PowerSimulator(BaseSimulator):
         delta = diff / (1 + ecart_rel * ecart_med  * 100)
 
 
-        bpm = last_bpm + delta
-        self._bpms.append(bpm)
-
-
-        return bpm
+        return last_bpm + delta
 
 
     def step(self, target_power, times=1):
@@ -236,20 +313,121 @@ class PowerSimulator(BaseSimulator):
             ret = self._step(target_power)
         return ret
 
+    def _record(self, power_series, bpms, effective_power):
+        count = len(bpms)
+        self.time += count
+        self._time += count
+        self._target_power.extend(power_series)
+        self._effective_power.extend(effective_power)
+        self._bpms.extend(bpms)
+
+    def simulate(self, power_series):
+        """
+        Mode batch : équivalent à appeler step() sur chaque valeur de
+        power_series (une par seconde), l'état du simulateur est mis à jour.
+
+        :param power_series: tableau de puissance à chaque seconde (en W)
+        :return: Result(bpm, power) avec les FC simulées et la puissance effective
+        """
+        power = np.asarray(power_series, dtype=float)
+        z1_left, bpm1 = self._z1.consume_array(power)
+        z2_left, bpm2 = self._z2.consume_array(z1_left)
+        z3_left, bpm3 = self._z3.consume_array(z2_left)
+        effective_power = power - z3_left
+
+        # seule la réponse cardiaque reste séquentielle
+        target_bpm = (self.min_freq + bpm3 + bpm1 + bpm2).tolist()
+        bpms = np.empty(len(target_bpm))
+        last_bpm = self.last_bpm
+        for i, target in enumerate(target_bpm):
+            last_bpm = self._next_bpm(last_bpm, target)
+            bpms[i] = last_bpm
+
+        self._record(power, bpms, effective_power)
+        return self.Result(bpms, effective_power)
+
+    def snapshot(self):
+        """État courant du simulateur (dict), à repasser à restore()"""
+        return {
+            "time": self.time,
+            "_time": self._time,
+            "init_freq": self.init_freq,
+            "bpm": self._current_bpm(),
+            "zones": [z.snapshot() for z in self._zones],
+        }
+
+    def restore(self, state):
+        """
+        Revient à l'état d'un snapshot(). L'historique repart de cet état :
+        il ne contient plus que la FC de l'instantané.
+        """
+        self.time = state["time"]
+        self._time = state["_time"]
+        self.init_freq = state["init_freq"]
+        for zone, zone_state in zip(self._zones, state["zones"]):
+            zone.restore(zone_state)
+        for x in (self._bpms, self._effective_power, self._target_power, self._effort_charge):
+            x.clear()
+        if state["bpm"] is not None:
+            self._bpms.append(state["bpm"])
+
+    def fork(self, history=None):
+        """Copie indépendante du simulateur (sans spill), à partir de l'état courant"""
+        ret = copy.copy(self)
+        for name in ("_z1", "_z2", "_z3"):
+            setattr(ret, name, copy.copy(getattr(self, name)))
+        ret._init_history(history or self._bpms.capacity, None)
+        ret.restore(self.snapshot())
+        return ret
+
+    def predict(self, plans):
+        """
+        Prévoit la FC pour plusieurs plans de puissance depuis l'état courant,
+        sans le modifier. Les plans sont simulés ensemble, un par cycliste
+        d'une PopulationSimulator.
+
+        :param plans: tableau (K, T) de K plans de T secondes (en W)
+        :return: tableau (K, T) des FC prévues
+        """
+        from bles.core.simulator.population import PopulationSimulator
+
+        plans = np.atleast_2d(np.asarray(plans, dtype=float))
+        population = PopulationSimulator.from_simulator(self, len(plans))
+        ret = np.empty(plans.shape)
+        for t in range(plans.shape[1]):
+            ret[:, t] = population.step(plans[:, t])
+        return ret
+
+    def choose_power(self, target_bpm, candidates, horizon=300):
+        """
+        Choisit, parmi des puissances constantes candidates, celle dont la FC
+        prévue sur `horizon` secondes est la plus proche de target_bpm.
+
+        :return: (puissance, FC prévues pour cette puissance)
+        """
+        candidates = np.asarray(candidates, dtype=float)
+        bpms = self.predict(np.repeat(candidates[:, None], horizon, axis=1))
+        best = int(np.argmin(np.abs(bpms - target_bpm).mean(axis=1)))
+        return candidates[best], bpms[best]
+
 
 
 class GPTPowerSimulator(PowerSimulator):
 
+    def __init__(self, *args, tau_rest=30, tau_peak=5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tau_rest = tau_rest
+        self.tau_peak = tau_peak
+        self._fc = None
+        self._tau = None
+
     def tau_dynamic(self, fc):
         """
         Tau varie de manière exponentielle avec la FC.
         Plus on approche FC_max, plus tau est petit.
         """
-        tau_rest = 30
-        tau_peak = 5
-
         ratio = (fc - self.min_freq) / self.range_fc
-        return tau_peak + (tau_rest - tau_peak) * np.exp(-4 * ratio)
+        return self.tau_peak + (self.tau_rest - self.tau_peak) * np.exp(-4 * ratio)
 
     def target_heart_rate(self, power):
         """Fréquence cardiaque cible à un instant donné, en fonction de la puissance"""
@@ -258,6 +436,11 @@ class GPTPowerSimulator(PowerSimulator):
         midpoint = 0.5
         return self.min_freq + (self.max_freq - self.min_freq) / (1 + np.exp(-steepness * (power_ratio - midpoint)))
 
+    def _next_heart_rate(self, fc, power, tau):
+        fc_target = self.target_heart_rate(power)
+        # Formule d'ajustement exponentiel
+        return fc + (fc_target - fc) / tau
+
     def simulate_dynamic_heart_rate(self, power_series):
         """
         Simule l'évolution dynamique de la fréquence cardiaque au fil du temps.
@@ -276,20 +459,87 @@ class GPTPowerSimulator(PowerSimulator):
         tau = self.tau_dynamic(fc_values[-1])
 
         for t in range(1, len(power_series)):
-            fc_target = self.target_heart_rate(power_series[t])
-            # Formule d'ajustement exponentiel
-            fc_values[t] = fc_values[t - 1] + (fc_target - fc_values[t - 1]) / tau
+            fc_values[t] = self._next_heart_rate(fc_values[t - 1], power_series[t], tau)
 
         return fc_values
 
+    def _init_heart_rate(self):
+        # Comme dans simulate_dynamic_heart_rate, la première puissance est
+        # ignorée et tau est évalué sur fc_values[-1], qui vaut encore 0
+        # dès que la série fait plus d'un point.
+        self._fc = np.float64(self.init_freq or 100)
+        self._tau = self.tau_dynamic(np.float64(0))
+
     def _step(self, target_power):
+        """
+        Version incrémentale de simulate_dynamic_heart_rate : on conserve la
+        dernière FC et tau entre deux appels, chaque pas est en O(1).
+        """
         real_power = int(target_power)
-        self._target_power.append(real_power)
-        powers = np.array(self._target_power, dtype=int)
-        ret = self.simulate_dynamic_heart_rate(powers)
-        bpm = ret[-1]
-        self._bpms.append(bpm)
-        return bpm
+        if self._fc is None:
+            self._init_heart_rate()
+        else:
+            self._fc = self._next_heart_rate(self._fc, real_power, self._tau)
+        self._bpms.append(self._fc)
+        # pas de zones : toute la puissance est effective, comme dans simulate()
+        self._effective_power.append(real_power)
+        return self._fc
+
+    def simulate(self, power_series):
+        power = np.asarray(power_series, dtype=int)
+        targets = self.target_heart_rate(power).tolist()
+        bpms = np.empty(len(targets))
+        start = 0
+        if self._fc is None and len(targets):
+            self._init_heart_rate()
+            bpms[0] = self._fc
+            start = 1
+
+        if start < len(targets):
+            fc = float(self._fc)
+            tau = float(self._tau)
+            for i in range(start, len(targets)):
+                fc = fc + (targets[i] - fc) / tau
+                bpms[i] = fc
+            self._fc = np.float64(fc)
+
+        self._record(power, bpms, power)
+        return self.Result(bpms, power)
+
+    def _current_bpm(self):
+        return self._bpms[-1] if self._bpms else self.init_freq or 100
+
+    def snapshot(self):
+        ret = super().snapshot()
+        ret.update({
+            "fc": self._fc,
+            "tau": self._tau,
+        })
+        return ret
+
+    def restore(self, state):
+        super().restore(state)
+        self._fc = state["fc"]
+        self._tau = state["tau"]
+
+    def predict(self, plans):
+        plans = np.atleast_2d(np.asarray(plans, dtype=int))
+        targets = self.target_heart_rate(plans)
+        ret = np.empty(plans.shape)
+        start = 0
+        if self._fc is None:
+            fork = self.fork(history=1)
+            fork._init_heart_rate()
+            fc, tau = fork._fc, fork._tau
+            ret[:, 0] = fc
+            start = 1
+        else:
+            fc, tau = self._fc, self._tau
+        fc = np.full(len(plans), fc)
+        for t in range(start, plans.shape[1]):
+            fc = fc + (targets[:, t] - fc) / tau
+            ret[:, t] = fc
+        return ret
 
 
 def get_values():
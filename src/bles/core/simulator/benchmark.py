@@ -0,0 +1,144 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from bles.core.simulator.base_simulator import PowerSimulator, GPTPowerSimulator
+from bles.core.simulator.fitting import load_sessions
+from bles.core.simulator.zone_simulator import ZoneAerobie, Watt
+from tests import TEST_DATA
+
+
+class ZoneAerobieSimulator:
+    """Adaptateur de ZoneAerobie vers l'interface step() / simulate() des simulateurs"""
+
+    def __init__(self, pma=200, age=33, min_freq=55, compiled=False, **kwargs):
+        self.min_freq = min_freq
+        self.compiled = compiled
+        self.zone = ZoneAerobie(pma, age)
+        if compiled:
+            self.zone = self.zone.compile()
+
+    def step(self, power):
+        if self.compiled:
+            self.zone.require_power(float(power))
+        else:
+            self.zone.require_power(Watt(float(power)))
+        return self.zone.bpm + self.min_freq
+
+    def simulate(self, power_series):
+        zone = self.zone if self.compiled else self.zone.compile()
+        _, bpm, _ = zone.simulate(power_series)
+        return PowerSimulator.Result(bpm + self.min_freq, np.asarray(power_series))
+
+
+# nom -> (classe, mode) ; mode "step" : un appel par seconde, "batch" : simulate()
+MODELS = {
+    "PowerSimulator": (PowerSimulator, "step"),
+    "PowerSimulator.simulate": (PowerSimulator, "batch"),
+    "GPTPowerSimulator": (GPTPowerSimulator, "step"),
+    "GPTPowerSimulator.simulate": (GPTPowerSimulator, "batch"),
+    "ZoneAerobie": (ZoneAerobieSimulator, "step"),
+    "ZoneAerobie.simulate": (ZoneAerobieSimulator, "batch"),
+}
+
+
+def _run(simu, mode, powers):
+    if mode == "batch":
+        return np.asarray(simu.simulate(powers).bpm, dtype=float)
+    ret = np.empty(len(powers))
+    for i, power in enumerate(powers.tolist()):
+        ret[i] = simu.step(power)
+    return ret
+
+
+def benchmark(name, session, repeat=3):
+    cls, mode = MODELS[name]
+    kwargs = {"init_freq": int(session.heartrate[0])}
+
+    durations = []
+    for _ in range(repeat):
+        simu = cls(**kwargs)
+        start = time.perf_counter()
+        bpms = _run(simu, mode, session.power)
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    _run(cls(**kwargs), mode, session.power)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    error = bpms - session.heartrate
+    duration = min(durations)
+    return {
+        "model": name,
+        "session": session.name,
+        "steps": len(session.power),
+        "duration": duration,
+        "steps_per_second": len(session.power) / duration if duration else None,
+        "peak_memory": peak,
+        "mae": float(np.mean(np.abs(error))),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(directory=TEST_DATA, models=None, repeat=3):
+    results = []
+    for session in load_sessions(directory):
+        for name in models or MODELS:
+            results.append(benchmark(name, session, repeat))
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+
+
+def compare(previous, current):
+    """Affiche l'évolution de chaque mesure par rapport à un précédent rapport"""
+    old = {(x["model"], x["session"]): x for x in previous["results"]}
+    for x in current["results"]:
+        y = old.get((x["model"], x["session"]))
+        if y is None:
+            continue
+        speed = x["steps_per_second"] / y["steps_per_second"] if y["steps_per_second"] else float("nan")
+        print(f"{x['model']:>28} {x['session'][:24]:>24} : vitesse x{speed:.2f}"
+              f" mae {y['mae']:.3f} -> {x['mae']:.3f} rmse {y['rmse']:.3f} -> {x['rmse']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des simulateurs de FC (vitesse, mémoire, précision)")
+    parser.add_argument("directory", nargs="?", default=TEST_DATA)
+    parser.add_argument("-o", "--output", default=None, help="fichier JSON de sortie (stdout par défaut)")
+    parser.add_argument("-m", "--model", action="append", choices=list(MODELS), default=None)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-c", "--compare", default=None, help="rapport JSON précédent")
+    args = parser.parse_args()
+
+    report = run(args.directory, args.model, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == '__main__':
+    main()
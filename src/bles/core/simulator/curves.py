@@ -0,0 +1,95 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+
+def log_decreasing(k, base):
+    """f(x) = log(1 + k - k.x) / log(1 + k) : 1 en 0, 0 en 1 (la base se simplifie)"""
+    norm = math.log(1 + k, base)
+    return lambda x: np.log(1 + (k - x * k)) / math.log(base) / norm
+
+
+def log_increasing(k, base):
+    """f(x) = log(1 + k.x) / log(1 + k) : 0 en 0, 1 en 1"""
+    norm = math.log(1 + k, base)
+    return lambda x: np.log(1 + x * k) / math.log(base) / norm
+
+
+def sigmoid(steepness, midpoint):
+    """Sigmoïde normalisée de playground.functions.exp"""
+    maxi = (1 + math.exp(-steepness * (-midpoint)))
+    mini = (1 + math.exp(-steepness * (1 - midpoint)))
+    if mini > maxi:
+        mini, maxi = maxi, mini
+    return lambda x: ((1 + np.exp(-steepness * (x - midpoint))) - mini) / (maxi - mini)
+
+
+_curves_ = {
+    "log_decreasing": log_decreasing,
+    "log_increasing": log_increasing,
+    "sigmoid": sigmoid,
+}
+
+
+class CurveTable:
+    """
+    Fonction de [lo, hi] précalculée sur une grille régulière et interpolée
+    linéairement. La grille est raffinée jusqu'à ce que l'erreur mesurée au
+    milieu de chaque intervalle soit inférieure à `tolerance` (max_error).
+
+    Hors de [lo, hi], x est ramené dans l'intervalle si clip, sinon la
+    fonction est calculée directement, comme pour NaN et les infinis.
+    """
+
+    def __init__(self, fct, lo=0.0, hi=1.0, clip=True, tolerance=1e-6, size=1024, max_size=1 << 20):
+        self.fct = fct
+        self.lo = lo
+        self.hi = hi
+        self.clip = clip
+
+        while True:
+            x = np.linspace(lo, hi, size + 1)
+            y = fct(x)
+            middle = fct((x[:-1] + x[1:]) / 2)
+            error = float(np.abs(middle - (y[:-1] + y[1:]) / 2).max())
+            if error <= tolerance or size >= max_size:
+                break
+            size *= 2
+
+        self.size = size
+        self.max_error = error
+        self._x = x
+        self._y = y
+        self._scale = size / (hi - lo)
+        # listes python : l'accès scalaire y est bien plus rapide que sur numpy
+        self._values = y.tolist()
+        self._slopes = np.diff(y).tolist() + [0.0]
+
+    def __call__(self, x):
+        if not self.lo < x < self.hi:
+            if not self.clip or not math.isfinite(x):
+                return float(self.fct(x))
+            x = min(max(x, self.lo), self.hi)
+        pos = (x - self.lo) * self._scale
+        i = int(pos)
+        return self._values[i] + self._slopes[i] * (pos - i)
+
+    def array(self, x):
+        x = np.asarray(x, dtype=float)
+        ret = np.interp(x, self._x, self._y)
+        outside = ~np.isfinite(x)
+        if not self.clip:
+            outside |= (x < self.lo) | (x > self.hi)
+        if outside.any():
+            ret[outside] = self.fct(x[outside])
+        return ret
+
+
+@lru_cache(maxsize=None)
+def curve_table(name, *params, lo=0.0, hi=1.0, clip=True):
+    """
+    Table partagée pour une courbe et ses paramètres, p. ex.
+    curve_table("log_decreasing", k, base) ou curve_table("sigmoid", steepness, midpoint)
+    """
+    return CurveTable(_curves_[name](*params), lo=lo, hi=hi, clip=clip)
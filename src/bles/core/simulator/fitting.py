@@ -0,0 +1,243 @@
+import argparse
+import inspect
+import json
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from bles.common.csv_elite import read_csv_elite
+from bles.core.simulator.base_simulator import PowerSimulator, GPTPowerSimulator
+from tests import TEST_DATA
+
+
+SIMULATORS = {
+    cls.__name__: cls for cls in (PowerSimulator, GPTPowerSimulator)
+}
+
+# Espace de recherche : (min, max) pour un paramètre cherché, une valeur fixe
+# sinon. init_freq à None -> première FC enregistrée de chaque session.
+DEFAULT_SPACES = {
+    "PowerSimulator": {
+        "min_freq": (45, 75),
+        "max_freq": (165, 205),
+        "pma": (100, 400),
+        "init_freq": None,
+    },
+    "GPTPowerSimulator": {
+        "min_freq": (45, 75),
+        "max_freq": (165, 205),
+        "pma": (100, 400),
+        "init_freq": None,
+        "tau_rest": (5, 200),
+        "tau_peak": (1, 30),
+    },
+}
+
+
+Session = namedtuple("Session", ["name", "power", "heartrate"])
+
+
+def load_session(path):
+    path = Path(path)
+    try:
+        csv = read_csv_elite(path)
+        power = np.array([x["power"] for x in csv], dtype=int)
+        heartrate = np.array([x["heartrate"] for x in csv], dtype=float)
+    except (KeyError, ValueError):
+        # pas un export Elite (ou pas de puissance / FC)
+        return None
+    if not len(power):
+        return None
+    return Session(path.name, power, heartrate)
+
+
+def load_sessions(directory):
+    ret = []
+    for file in sorted(Path(directory).glob("*.csv")):
+        session = load_session(file)
+        if session is not None:
+            ret.append(session)
+    return ret
+
+
+def create_simulator(simulator, params, session=None):
+    kwargs = dict(params)
+    if kwargs.get("init_freq") is None and session is not None:
+        kwargs["init_freq"] = int(session.heartrate[0])
+    return SIMULATORS[simulator](**kwargs)
+
+
+def default_params(simulator, space):
+    """Valeurs par défaut du constructeur pour les paramètres cherchés de l'espace"""
+    defaults = {}
+    for cls in reversed(SIMULATORS[simulator].__mro__):
+        init = cls.__dict__.get("__init__")
+        if init is None:
+            continue
+        for p in inspect.signature(init).parameters.values():
+            if p.default is not p.empty:
+                defaults[p.name] = p.default
+    return {k: defaults[k] if isinstance(v, (tuple, list)) else v for k, v in space.items()}
+
+
+def session_error(simulator, params, session):
+    simu = create_simulator(simulator, params, session)
+    bpms = simu.simulate(session.power).bpm
+    return float(np.mean(np.abs(bpms - session.heartrate)))
+
+
+_sessions = None
+
+def _init_worker(sessions):
+    global _sessions
+    _sessions = sessions
+
+
+def _evaluate(args):
+    simulator, params = args
+    errors = [session_error(simulator, params, s) for s in _sessions]
+    return float(np.mean(errors)), params
+
+
+class Profile:
+
+    def __init__(self, simulator, params, mae=None, sessions=None, rider=None):
+        self.simulator = simulator
+        self.params = dict(params)
+        self.mae = mae
+        self.sessions = list(sessions or [])
+        self.rider = rider
+
+    def to_json(self):
+        return {
+            "rider": self.rider,
+            "simulator": self.simulator,
+            "params": self.params,
+            "mae": self.mae,
+            "sessions": self.sessions,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["simulator"], data["params"], data.get("mae"),
+                   data.get("sessions"), data.get("rider"))
+
+    def save(self, file):
+        file = Path(file)
+        file.parent.mkdir(exist_ok=True, parents=True)
+        file.write_text(json.dumps(self.to_json(), indent=2))
+
+    @classmethod
+    def load(cls, file):
+        return cls.from_json(json.loads(Path(file).read_text()))
+
+    def create_simulator(self, **kwargs):
+        params = dict(self.params)
+        params.update(kwargs)
+        return create_simulator(self.simulator, params)
+
+
+def load_profile(profile, **kwargs):
+    """Instancie le simulateur décrit par un profil (fichier, dict ou Profile)"""
+    if isinstance(profile, (str, Path)):
+        profile = Profile.load(profile)
+    elif isinstance(profile, dict):
+        profile = Profile.from_json(profile)
+    return profile.create_simulator(**kwargs)
+
+
+class Fitter:
+    """
+    Recherche aléatoire par tours successifs : à chaque tour l'espace est
+    resserré autour des meilleurs candidats du tour précédent. Les paramètres
+    par défaut du simulateur sont toujours évalués : le profil trouvé n'est
+    jamais moins bon qu'eux.
+    """
+
+    def __init__(self, sessions, simulator="GPTPowerSimulator", space=None,
+                 workers=None, seed=None):
+        self.sessions = list(sessions)
+        if not self.sessions:
+            raise ValueError("Aucune session exploitable")
+        self.simulator = simulator
+        self.space = dict(space or DEFAULT_SPACES[simulator])
+        self.workers = workers or os.cpu_count()
+        self.random = random.Random(seed)
+
+    def _sample(self, space):
+        ret = {}
+        for k, v in space.items():
+            if isinstance(v, (tuple, list)):
+                ret[k] = self.random.uniform(*v)
+            else:
+                ret[k] = v
+        return ret
+
+    def _shrink(self, space, best):
+        ret = {}
+        for k, v in space.items():
+            if isinstance(v, (tuple, list)):
+                values = [p[k] for p in best]
+                margin = (max(values) - min(values)) * 0.25
+                ret[k] = (max(v[0], min(values) - margin), min(v[1], max(values) + margin))
+            else:
+                ret[k] = v
+        return ret
+
+    def fit(self, iterations=200, rounds=3, keep=0.1, rider=None, progress=None):
+        """
+        :param progress: appelé après chaque tour avec (tour, rounds, mae, params) du meilleur candidat
+        """
+        space = self.space
+        results = []
+        keep = max(1, int(iterations * keep))
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(self.sessions,)) as pool:
+            for i in range(rounds):
+                candidates = [(self.simulator, self._sample(space)) for _ in range(iterations)]
+                if not i:
+                    candidates.append((self.simulator, default_params(self.simulator, space)))
+                chunksize = max(1, len(candidates) // (self.workers * 4))
+                results.extend(pool.map(_evaluate, candidates, chunksize=chunksize))
+                results.sort(key=lambda x: x[0])
+                results = results[:keep]
+                if progress is not None:
+                    progress(i + 1, rounds, *results[0])
+                space = self._shrink(space, [p for _, p in results])
+
+        error, params = results[0]
+        return Profile(self.simulator, params, error,
+                       [s.name for s in self.sessions], rider)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibration des simulateurs de FC, un dossier de sessions par cycliste")
+    parser.add_argument("directories", nargs="*", default=[TEST_DATA])
+    parser.add_argument("-o", "--output", default="profiles")
+    parser.add_argument("-s", "--simulator", default="GPTPowerSimulator", choices=list(SIMULATORS))
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("-r", "--rounds", type=int, default=3)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        directory = Path(directory)
+        sessions = load_sessions(directory)
+        if not sessions:
+            print(f"{directory}: aucune session exploitable")
+            continue
+        fitter = Fitter(sessions, args.simulator, workers=args.workers, seed=args.seed)
+        profile = fitter.fit(args.iterations, args.rounds, rider=directory.name,
+                             progress=lambda i, n, mae, params: print(f"[{i}/{n}] mae={mae:.3f} {params}"))
+        file = Path(args.output) / f"{directory.name}.json"
+        profile.save(file)
+        print(f"{directory.name}: mae={profile.mae:.3f} -> {file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+from pathlib import Path
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Historique de taille fixe adossé à un tableau numpy.
+
+    Chaque valeur est écrite deux fois (à i et i + capacity) : les N dernières
+    valeurs sont donc toujours contiguës et tail(N) est une vue, sans copie.
+    Si spill est donné, il est appelé avec les valeurs les plus anciennes
+    (de la plus ancienne à la plus récente) avant qu'elles soient écrasées.
+    """
+
+    def __init__(self, capacity, dtype=float, spill=None):
+        if capacity <= 0:
+            raise ValueError("capacity doit être > 0")
+        self.capacity = capacity
+        self.spill = spill
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._index = 0
+        self._count = 0
+        self._spilled = 0
+
+    @property
+    def total(self):
+        """Nombre de valeurs reçues depuis la création"""
+        return self._count
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        return iter(self.tail())
+
+    def __getitem__(self, item):
+        return self.tail()[item]
+
+    def __array__(self, dtype=None, copy=None):
+        ret = self.tail()
+        return ret if dtype is None else ret.astype(dtype)
+
+    def tail(self, n=None):
+        n = len(self) if n is None else min(n, len(self))
+        end = self._index + self.capacity
+        return self._data[end - n:end]
+
+    def clear(self):
+        self.flush()
+        self._index = 0
+        self._count = 0
+        self._spilled = 0
+
+    def _spill(self):
+        self.spill(self.tail(self._count - self._spilled))
+        self._spilled = self._count
+
+    def flush(self):
+        if self.spill and self._count > self._spilled:
+            self._spill()
+
+    def append(self, x):
+        if self.spill and self._count - self._spilled == self.capacity:
+            self._spill()
+        i = self._index
+        self._data[i] = x
+        self._data[i + self.capacity] = x
+        self._index = (i + 1) % self.capacity
+        self._count += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        if not self.spill and len(values) > self.capacity:
+            self._count += len(values) - self.capacity
+            values = values[-self.capacity:]
+
+        while len(values):
+            if self.spill and self._count - self._spilled == self.capacity:
+                self._spill()
+            size = self.capacity - self._index
+            if self.spill:
+                size = min(size, self.capacity - (self._count - self._spilled))
+            chunk, values = values[:size], values[size:]
+            i, j = self._index, self._index + len(chunk)
+            self._data[i:j] = chunk
+            self._data[i + self.capacity:j + self.capacity] = chunk
+            self._index = j % self.capacity
+            self._count += len(chunk)
+
+
+class FileSpill:
+    """Spill vers disque : un fichier binaire brut (float64) par historique"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(exist_ok=True, parents=True)
+
+    def __call__(self, name, values):
+        with open(self.directory / f"{name}.bin", "ab") as fd:
+            values.tofile(fd)
+
+    def load(self, name):
+        return np.fromfile(self.directory / f"{name}.bin")
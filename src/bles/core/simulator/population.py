@@ -0,0 +1,226 @@
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+from bles.common.config import SequencerConfig
+from bles.common.timer import Timer
+from bles.core.ble import features
+from bles.core.controller.base import list_controller
+from bles.core.sequencer.base import ControllableSequencer, ANY_RIDER
+from bles.core.simulator.base_simulator import Zone1, Zone2, Zone3, f_array, f2_array, f2b_array
+
+
+class PopulationSimulator:
+    """
+    Modèle de PowerSimulator pour N cyclistes, stocké en tableaux (un élément
+    par cycliste) et avancé d'une seconde pour tous les cyclistes à la fois.
+    """
+
+    _zones_ = (Zone1, Zone2, Zone3)
+    # (capacité, débit max) en proportion de la PMA, comme PowerSimulator
+    _zones_params_ = ((3600 * 0.6, 0.6), (3600 * 0.2, 1), (3600 * 0.1, 100))
+
+    def __init__(self, count, min_freq=55, max_freq=187, pma=200, init_freq=None, seed=None):
+        self.count = count
+        self.random = np.random.default_rng(seed)
+        self.min_freq = np.broadcast_to(np.asarray(min_freq, dtype=float), (count,)).copy()
+        self.max_freq = np.broadcast_to(np.asarray(max_freq, dtype=float), (count,)).copy()
+        self.pma = np.broadcast_to(np.asarray(pma, dtype=float), (count,)).copy()
+        self.range_fc = self.max_freq - self.min_freq
+        self.time = 0
+
+        self.capacite = np.empty((len(self._zones_), count))
+        self.debit_max = np.empty((len(self._zones_), count))
+        self.zone_fc_range = np.empty((len(self._zones_), count))
+        for i, (zone, (capacite, debit)) in enumerate(zip(self._zones_, self._zones_params_)):
+            ratio = zone.bpm_ratio_working
+            self.capacite[i] = self.pma * capacite
+            self.debit_max[i] = self.pma * debit
+            self.zone_fc_range[i] = (ratio[1] - ratio[0]) * self.range_fc
+
+        if init_freq is None:
+            # même tirage que PowerSimulator.last_bpm
+            base = self.random.integers(14, 41, count) / 100
+            init_freq = (self.min_freq + base * self.range_fc).astype(int)
+        self.bpm = np.broadcast_to(np.asarray(init_freq, dtype=float), (count,)).copy()
+        self.effective_power = np.zeros(count)
+        self.target_power = np.zeros(count)
+
+        self._lock = threading.Lock()
+        self._timer = None
+
+    @classmethod
+    def from_simulator(cls, simu, count):
+        """Population de `count` copies d'un PowerSimulator, dans son état courant"""
+        bpm = simu.snapshot()["bpm"]
+        if bpm is None:
+            # même tirage que PowerSimulator.last_bpm, sans modifier simu
+            bpm = int(simu.min_freq + random.randint(14, 40) / 100 * simu.range_fc)
+        ret = cls(count, simu.min_freq, simu.max_freq, simu.pma, bpm)
+        for i, zone in enumerate(simu._zones):
+            ret.capacite[i] = zone.capacite
+        return ret
+
+    def _consume(self, power):
+        x = power
+        bpm = self.min_freq.copy()
+        for i in range(len(self._zones_)):
+            maxi = np.minimum(self.capacite[i], self.debit_max[i])
+            left = np.maximum(0, x - maxi)
+            used = np.minimum(x, maxi)
+            self.capacite[i] -= used
+            effort = used / np.maximum(maxi, 1)
+            if i == 0:
+                effort = np.maximum(effort, 0.5)
+            bpm += effort * self.zone_fc_range[i]
+            x = left
+        return bpm, power - x
+
+    def _next_bpm(self, last_bpm, target_bpm):
+        diff = target_bpm - last_bpm
+        up = diff > 0
+        ecart_rel = f_array(np.abs(diff) / self.range_fc)
+        ecart_rel = np.where(up, ecart_rel, ecart_rel * 0.9)
+        med = np.abs(last_bpm - 100) / (self.range_fc / 2)
+        ecart_med = np.where(up,
+                             f2_array(med) / 2 + 1 - (1 / 2),
+                             f2b_array(med) / 7 + 1 - (1 / 7))
+        return last_bpm + diff / (1 + ecart_rel * ecart_med * 100)
+
+    def step(self, powers=None):
+        """
+        Avance tous les cyclistes d'une seconde.
+
+        :param powers: puissance cible de chaque cycliste, à défaut la dernière
+            puissance demandée via rider(i).step()
+        :return: les FC de tous les cyclistes
+        """
+        with self._lock:
+            if powers is not None:
+                self.target_power[:] = powers
+            target_bpm, self.effective_power = self._consume(self.target_power.copy())
+            self.bpm = self._next_bpm(self.bpm, target_bpm)
+            self.time += 1
+            return self.bpm
+
+    def rider(self, index):
+        return PopulationRider(self, index)
+
+    def riders(self):
+        return [self.rider(i) for i in range(self.count)]
+
+    def start(self, period=1):
+        if not self._timer:
+            self._timer = Timer(self.step, period)
+            self._timer.start()
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+
+
+class PopulationRider:
+    """
+    Vue sur un cycliste de la population, utilisable à la place d'un
+    PowerSimulator par FitnessClientDebug / HRClientDebug. step() ne fait
+    qu'enregistrer la puissance : la population est avancée par son timer.
+    """
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def last_bpm(self):
+        return float(self.population.bpm[self.index])
+
+    @property
+    def init_freq(self):
+        return self.last_bpm
+
+    def step(self, target_power, times=1):
+        self.population.target_power[self.index] = target_power
+        return self.last_bpm
+
+
+def create_sequencers(population, period=1):
+    ret = []
+    for rider in population.riders():
+        config = SequencerConfig()
+        for x in (features.cycling, features.heart_rate):
+            config.add_ble_client(x, x, timer=period)
+        for x in list_controller():
+            config.add_controller(x)
+
+        sequencer = ControllableSequencer(config)
+        sequencer.use_simulator(rider)
+        ret.append(sequencer)
+    return ret
+
+
+def create_sequencer(population, period=1):
+    """Un seul séquenceur pour toute la population, un rider par cycliste"""
+    config = SequencerConfig()
+    for rider in population.riders():
+        name = f"rider{rider.index}"
+        for x in (features.cycling, features.heart_rate):
+            config.add_ble_client(x, x, timer=period, rider=name)
+        for x in list_controller():
+            config.add_controller(x, rider=name)
+
+    sequencer = ControllableSequencer(config)
+    for rider in population.riders():
+        sequencer.use_simulator(rider, rider=f"rider{rider.index}")
+    return sequencer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge : N vélos virtuels sans matériel BLE")
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("-d", "--duration", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--riders", action="store_true", help="un seul séquenceur avec un rider par vélo")
+    args = parser.parse_args()
+
+    population = PopulationSimulator(args.count, seed=args.seed)
+    sequencers = [create_sequencer(population)] if args.riders else create_sequencers(population)
+    received = [0]
+    lock = threading.Lock()
+
+    def _count(*args):
+        with lock:
+            received[0] += 1
+
+    for sequencer in sequencers:
+        sequencer.add_handler(_count, rider=ANY_RIDER)
+        sequencer.start()
+
+    while not all(x.ready for x in sequencers):
+        time.sleep(0.1)
+
+    if args.riders:
+        for i, rider in enumerate(sequencers[0].riders.values()):
+            rider.use_controller("home_trainer").call_function("set_power", {"power": 100 + i % 150})
+    else:
+        for i, sequencer in enumerate(sequencers):
+            sequencer.use_controller("home_trainer").call_function("set_power", {"power": 100 + i % 150})
+
+    population.start()
+    start = time.time()
+    time.sleep(args.duration)
+    population.stop()
+    elapsed = time.time() - start
+
+    for sequencer in sequencers:
+        sequencer.stop()
+
+    print(f"{args.count} vélos, {received[0]} données en {elapsed:.1f}s ({received[0] / elapsed:.1f}/s)"
+          f", FC moyenne={population.bpm.mean():.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,18 @@
 
+import math
+import os
 from functools import total_ordering
 
+import numpy as np
+
 from bles.playground.functions import draw_function, show, Line
 
 
+# Vérification des unités en mode compilé : chaque pas est aussi calculé par
+# le modèle typé (Watt, Joule...) et comparé. Activable par BLES_UNIT_CHECK=1
+UNIT_CHECK = bool(os.environ.get("BLES_UNIT_CHECK"))
+
+
 @total_ordering
 class Unit:
     _type_ = None
@@ -153,6 +162,7 @@ class Zone:
     _debit_ = None
     _recharge_ = None
     _stress_ = 0
+    _compiled_class_ = None
 
 
     def __init__(self, pma, age,  **kwargs):
@@ -215,10 +225,115 @@ class Zone:
         r = self.working_fc_ratio[1] - self.working_fc_ratio[0]
         return float(self.oxygen_demand) * r * self.fc_range
 
+    def compile(self, check=None):
+        """
+        Retourne la même zone calculée en float (cf. CompiledZone), à partir
+        de l'état courant. check : vérifie chaque pas avec le modèle typé
+        (par défaut UNIT_CHECK).
+        """
+        return self._compiled_class_(self, UNIT_CHECK if check is None else check)
+
+
+def _float(x):
+    return float(x.value if isinstance(x, Unit) else x)
+
+
+class CompiledZone:
+    """
+    Zone abaissée en arithmétique float : mêmes calculs que Zone, sans
+    objets Watt / Joule / Ratio intermédiaires. Ce n'est pas une version
+    vectorisée : le stress de chaque seconde dépend du précédent à travers
+    un min(), le calcul reste une boucle Python, seulement sans unités.
+    """
+
+    def __init__(self, zone, check=False):
+        self.capacity = _float(zone.capacity)
+        self.debit = _float(zone.debit)
+        self.stress = _float(zone.stress)
+        self.oxygen_demand = _float(zone.oxygen_demand)
+        self.fc_range = zone.fc_range
+        self.working_fc_ratio = list(zone.working_fc_ratio)
+        self.reference = zone if check else None
+
+    def require_power(self, power):
+        energy = float(power * 1)
+        primary_energy = energy * (1 + 0.1 * self.stress)
+
+        maxi = min(self.capacity, float(self.debit * 1))
+        xb = min(maxi, primary_energy)
+        self._require_power(xb / maxi)
+
+        ret = max(0.0, primary_energy - maxi)
+        if self.reference is not None:
+            self._check(power, ret)
+        return ret
+
+    def _check(self, power, ret):
+        expected = float(self.reference.require_power(Watt(power)))
+        if not (math.isclose(ret, expected, abs_tol=1e-9)
+                and math.isclose(self.stress, _float(self.reference.stress), abs_tol=1e-9)):
+            raise AssertionError(f"Modèle compilé divergent pour {power} W : {ret} != {expected}")
+
+    def _require_power(self, x):
+        raise NotImplementedError()
+
+    @property
+    def bpm(self):
+        r = self.working_fc_ratio[1] - self.working_fc_ratio[0]
+        return self.oxygen_demand * r * self.fc_range
+
+    def simulate(self, power_series):
+        """
+        Applique require_power à chaque valeur de power_series (boucle
+        scalaire, les résultats sont rangés dans des tableaux).
+
+        :return: (énergie non fournie, bpm au-dessus de fc_min, stress), en tableaux
+        """
+        powers = np.asarray(power_series, dtype=float).tolist()
+        left = np.empty(len(powers))
+        bpm = np.empty(len(powers))
+        stress = np.empty(len(powers))
+        for i, power in enumerate(powers):
+            left[i] = self.require_power(power)
+            bpm[i] = self.bpm
+            stress[i] = self.stress
+        return left, bpm, stress
+
+
+class CompiledZoneAerobie(CompiledZone):
+
+    def _require_power(self, x):
+        self.oxygen_demand = x
+        self.stress = (9.0 * self.stress + self.oxygen_demand) / 10.0
+
+    def simulate(self, power_series):
+        if self.reference is not None:
+            return super().simulate(power_series)
+        # même boucle que require_power, en variables locales
+        powers = np.asarray(power_series, dtype=float).tolist()
+        left = np.empty(len(powers))
+        demand = np.empty(len(powers))
+        stress_values = np.empty(len(powers))
+        maxi = min(self.capacity, float(self.debit * 1))
+        stress = self.stress
+        x = self.oxygen_demand
+        for i, power in enumerate(powers):
+            primary_energy = float(power * 1) * (1 + 0.1 * stress)
+            x = min(maxi, primary_energy) / maxi
+            stress = (9.0 * stress + x) / 10.0
+            left[i] = max(0.0, primary_energy - maxi)
+            demand[i] = x
+            stress_values[i] = stress
+        self.oxygen_demand = x
+        self.stress = stress
+        r = self.working_fc_ratio[1] - self.working_fc_ratio[0]
+        return left, demand * r * self.fc_range, stress_values
+
 
 class ZoneAerobie(Zone):
     _capacity_ = 3600 * 4
     _debit_ = 0.7
+    _compiled_class_ = CompiledZoneAerobie
 
     @property
     def debit(self):
@@ -231,10 +346,9 @@ class ZoneAerobie(Zone):
 
 
 def power_curve(*args):
-    ret = []
-    for w, t in args:
-        ret.extend([w for _ in range(t)])
-    return ret
+    if not args:
+        return np.empty(0)
+    return np.concatenate([np.full(t, w) for w, t in args])
 
 
 if __name__ == "__main__":
@@ -253,17 +367,12 @@ if __name__ == "__main__":
             (100, 3 * MIN),
     )
 
-    z = ZoneAerobie(200, 33)
+    z = ZoneAerobie(200, 33).compile()
+    left, bpm, stress = z.simulate(curve)
     POW = Line(curve, "power")
-    REALPOW = Line([], "real_power")
-    STRESS = Line([], "stress")
-    TIME = []
-    Y = Line([], "bpm")
-    for i, x in enumerate(POW):
-        TIME.append(i)
-        REALPOW.append(x-float(z.require_power(Watt(x))))
-        bpm = z.bpm+ 55
-        Y.append(bpm)
-        STRESS.append(z.stress*100)
+    REALPOW = Line(curve - left, "real_power")
+    STRESS = Line(stress * 100, "stress")
+    TIME = list(range(len(curve)))
+    Y = Line(bpm + 55, "bpm")
 
     show(TIME, POW, Y, REALPOW, STRESS)
@@ -1,9 +1,10 @@
-import math
 from functools import partial
 
 import numpy as np
 from matplotlib import pyplot as plt
 
+from bles.core.simulator.curves import curve_table
+
 class Line(list):
     def __init__(self, Y, label=None):
         super().__init__(Y)
@@ -88,11 +89,7 @@ def show(X, *Yn):
 
 
 def exp(ratio, steepness=10, midpoint=0.75):
-    maxi = (1 + math.exp(-steepness * (-midpoint)))
-    mini = (1 + math.exp(-steepness * (1-midpoint)))
-    if mini > maxi:
-        mini, maxi = maxi, mini
-    return ((1 + math.exp(-steepness * (ratio - midpoint)))-mini) / (maxi - mini)
+    return curve_table("sigmoid", steepness, midpoint, clip=False)(ratio)
 
 def exp_inv(ratio, steepness=10, midpoint=0.75):
     return exp(1 - ratio, steepness=steepness, midpoint=midpoint)
@@ -1,3 +1,17 @@
 import pytest
 
 
+class CountingSimulator:
+    """Simulateur de FC qui ne fait que compter ses pas"""
+    last_bpm = 100
+
+    def __init__(self):
+        self.steps = 0
+
+    def step(self, power):
+        self.steps += 1
+
+
+@pytest.fixture
+def counting_simulator():
+    return CountingSimulator()
@@ -0,0 +1,23 @@
+import math
+
+import numpy as np
+
+from bles.core.simulator.base_simulator import f, f2, f_array
+from bles.core.simulator.curves import curve_table, log_decreasing
+from bles.playground.functions import exp
+
+
+def test_table_matches_exact_function():
+    table = curve_table("log_decreasing", 100, 10)
+    exact = log_decreasing(100, 10)
+    x = np.linspace(0, 1, 1001)
+    assert np.abs(table.array(x) - exact(x)).max() <= table.max_error
+    assert all(abs(table(v) - float(exact(v))) <= table.max_error for v in x[::50])
+
+
+def test_nan_propagates():
+    assert math.isnan(f(float("nan")))
+    assert math.isnan(f2(float("nan")))
+    assert math.isnan(exp(float("nan")))
+    ret = f_array([0.5, np.nan])
+    assert not math.isnan(ret[0]) and math.isnan(ret[1])
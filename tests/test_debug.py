@@ -0,0 +1,60 @@
+import statistics
+import time
+
+from bles.common.timer import AcceleratedClock, Time
+from bles.core.ble.debug import FitnessClientDebug
+from tests.conftest import CountingSimulator
+
+
+def test_simulator_steps_once_per_second_at_10hz(counting_simulator):
+    client = FitnessClientDebug(timer=0.1, seed=0)
+    client.set_debug_simulator(counting_simulator)
+    for _ in range(100):
+        client._on_timer()
+    assert counting_simulator.steps == 10
+
+
+def _run(clock, duration, **kwargs):
+    """Échantillons produits par un client de debug pendant `duration` secondes réelles"""
+    with Time.use_clock(clock):
+        client = FitnessClientDebug(**kwargs)
+        simu = CountingSimulator()
+        client.set_debug_simulator(simu)
+        samples = []
+        client.add_handler(lambda feature, data: samples.append(data))
+        client.run_thread()
+        try:
+            assert client.wait_for_connection(5)
+            time.sleep(duration)
+        finally:
+            client.stop()
+            client.join()
+    return samples, simu
+
+
+def test_accelerated_clock_keeps_simulated_rate():
+    # 20x : 0.6s réelles font environ 12s simulées, soit ~120 échantillons à 10Hz
+    samples, simu = _run(AcceleratedClock(20), 0.6, timer=0.1, seed=0)
+    assert 80 <= len(samples) <= 125
+    # échéances t0 + n * période en temps simulé : un échantillon en retard
+    # (gigue du thread, x20) est rattrapé, l'écart à la grille ne s'accumule pas
+    offsets = [x.timestamp - n * 0.1 for n, x in enumerate(samples)]
+    assert abs(statistics.median(offsets[-20:]) - statistics.median(offsets[:20])) < 0.1
+    # un pas du simulateur par seconde simulée
+    assert abs(simu.steps - len(samples) / 10) <= 1
+
+
+def test_high_rate_without_drift():
+    samples, simu = _run(AcceleratedClock(1), 0.5, timer=0.005, seed=0)
+    # 200Hz : ~100 échantillons en 0.5s, pas de retard cumulé
+    assert len(samples) >= 80
+    offsets = [x.timestamp - n * 0.005 for n, x in enumerate(samples)]
+    assert abs(statistics.median(offsets[-20:]) - statistics.median(offsets[:20])) < 0.02
+
+
+def test_seed_makes_runs_reproducible():
+    a, _ = _run(AcceleratedClock(50), 0.2, timer=0.1, seed=42)
+    b, _ = _run(AcceleratedClock(50), 0.2, timer=0.1, seed=42)
+    n = min(len(a), len(b))
+    assert n > 10
+    assert [(x.power, x.cadence) for x in a[:n]] == [(x.power, x.cadence) for x in b[:n]]
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+from bles.core.sequencer.dispatch import Dispatcher, BLOCK, DATA, DEVICE, ALIGNED, match
+
+
+def _dispatch_threads():
+    return [x for x in threading.enumerate() if x.name.startswith("dispatch-")]
+
+
+def test_threads_only_run_between_start_and_stop():
+    before = len(_dispatch_threads())
+    dispatcher = Dispatcher()
+    received = []
+    dispatcher.subscribe(lambda feature, data: received.append(data), "test")
+    assert len(_dispatch_threads()) == before
+
+    dispatcher.start()
+    dispatcher.publish((DATA, "default", "cycling", "cycling"), "cycling", 1)
+    dispatcher.stop(1)
+    assert received == [1]
+    assert len(_dispatch_threads()) == before
+
+    # abonnement gardé, livré après un nouveau start()
+    dispatcher.start()
+    dispatcher.publish((DATA, "default", "cycling", "cycling"), "cycling", 2)
+    dispatcher.stop(1)
+    assert received == [1, 2]
+
+
+def test_stop_drops_what_is_left_after_timeout():
+    dispatcher = Dispatcher()
+    received = []
+    sub = dispatcher.subscribe(lambda feature, data: (time.sleep(0.2), received.append(data)), "slow")
+    dispatcher.start()
+    for i in range(10):
+        dispatcher.publish(None, "cycling", i)
+    dispatcher.stop(0.1)
+    time.sleep(0.5)
+    # seul l'élément en cours au moment de l'arrêt est terminé
+    assert received == [0]
+    assert sub.dropped == 9
+
+
+def test_block_never_waits_on_event_loop():
+    dispatcher = Dispatcher(maxsize=1, policy=BLOCK)
+    gate = threading.Event()
+    sub = dispatcher.subscribe(lambda feature, data: gate.wait(), "blocked", block_timeout=5)
+    dispatcher.start()
+
+    async def _publish():
+        start = time.perf_counter()
+        for i in range(5):
+            dispatcher.publish(None, "cycling", i)
+        return time.perf_counter() - start
+
+    assert asyncio.run(_publish()) < 1
+    assert sub.dropped >= 3
+    gate.set()
+    dispatcher.stop(1)
+
+
+def test_match_wildcards():
+    topic = (DATA, "alice", "cycling", "trainer")
+    assert match(topic, (None, None, None, None))
+    assert match(topic, (DATA, "alice", None, None))
+    assert match(topic, (None, None, "cycling", "trainer"))
+    assert not match(topic, (DATA, "bob", None, None))
+    assert not match(topic, (DEVICE, None, None, None))
+    # longueur différente : pas de correspondance
+    assert not match(topic, (DATA, "alice", None))
+    assert not match(topic, (DATA, "alice", None, None, None))
+
+
+def test_lookup_filters_topics():
+    dispatcher = Dispatcher()
+    everything = dispatcher.subscribe(lambda *args: None, "all")
+    alice = dispatcher.subscribe(lambda *args: None, "alice", topics=[(DATA, "alice", None, None)])
+    cycling = dispatcher.subscribe(lambda *args: None, "cycling",
+                                   topics=[(DATA, None, "cycling", None), (ALIGNED, None, None, None)])
+
+    assert dispatcher.lookup((DATA, "alice", "cycling", "trainer")) == (everything, alice, cycling)
+    assert dispatcher.lookup((DATA, "alice", "heart_rate", "strap")) == (everything, alice)
+    assert dispatcher.lookup((DATA, "bob", "cycling", "trainer")) == (everything, cycling)
+    assert dispatcher.lookup((ALIGNED, "bob", None, None)) == (everything, cycling)
+    assert dispatcher.lookup((DEVICE, "bob", "cycling", "connect")) == (everything,)
+
+
+def test_table_is_invalidated_on_subscribe_and_unsubscribe():
+    dispatcher = Dispatcher()
+    topic = (DATA, "alice", "cycling", "trainer")
+    first = dispatcher.subscribe(lambda *args: None, "first")
+    dispatcher.prepare([topic])
+    assert dispatcher.lookup(topic) == (first,)
+
+    second = dispatcher.subscribe(lambda *args: None, "second", topics=[(DATA, "alice", None, None)])
+    assert dispatcher.lookup(topic) == (first, second)
+
+    dispatcher.unsubscribe(first)
+    assert dispatcher.lookup(topic) == (second,)
+    assert dispatcher.subscribers == (second,)
+
+    # Subscriber.unsubscribe passe par son Dispatcher
+    second.unsubscribe()
+    assert dispatcher.lookup(topic) == ()
+    assert dispatcher.subscribers == ()
+
+
+def test_unsubscribed_handler_receives_nothing():
+    dispatcher = Dispatcher()
+    received = []
+    sub = dispatcher.subscribe(lambda feature, data: received.append(data), "test")
+    other = dispatcher.subscribe(lambda feature, data: None, "other")
+    dispatcher.start()
+    topic = (DATA, "default", "cycling", "cycling")
+    dispatcher.publish(topic, "cycling", 1)
+    sub.unsubscribe()
+    dispatcher.publish(topic, "cycling", 2)
+    dispatcher.stop(1)
+    assert received == [1]
+    assert sub.received == 1
+    assert other.received == 2
+    assert sub._thread is None
+
+
+def test_duplicate_names_are_made_unique():
+    dispatcher = Dispatcher()
+    a = dispatcher.subscribe(lambda *args: None, "csv")
+    b = dispatcher.subscribe(lambda *args: None, "csv")
+    assert a.name != b.name
+    assert set(dispatcher.get_status()["subscribers"]) == {a.name, b.name}
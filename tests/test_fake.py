@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from bles.core.ble.fake import FakeBleakClient, FakeDevice, create_fake_clients
+
+
+@pytest.mark.parametrize("period", [0.1, 0.25, 1, 2])
+def test_hr_simulator_steps_once_per_second(counting_simulator, period):
+    device = FakeDevice(simulator=counting_simulator)
+    ticks = round(10 / period)
+    for _ in range(ticks):
+        device.step(device, period)
+    assert counting_simulator.steps == 10
+
+
+def _wait(predicate, timeout=5):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "délai dépassé"
+        time.sleep(0.01)
+
+
+def test_fitness_client_over_fake_backend():
+    device = FakeDevice(seed=0)
+    trainer, strap = create_fake_clients(device, period=0.02, seed=0)
+    trainer.scheduler.min_interval = 0
+    cycling, heart = [], []
+    trainer.add_handler(lambda feature, data: cycling.append(data))
+    strap.add_handler(lambda feature, data: heart.append(data))
+    for client in (trainer, strap):
+        client.run_thread()
+    try:
+        assert trainer.wait_for_connection(5) and strap.wait_for_connection(5)
+        # lectures de _start_service
+        assert trainer.ftms_features["power_measurement_supported"]
+        assert trainer.power_range == list(device.power_range[:2])
+        assert trainer.resistance_range == list(device.resistance_range[:2])
+        assert device.control
+
+        trainer.set_power(200)
+        # aller-retour mesuré à l'indication du control point
+        _wait(lambda: trainer.control_latency.count)
+        assert trainer.control_errors == 0
+        assert device.target_power == 200
+
+        count = len(cycling)
+        _wait(lambda: len(cycling) >= count + 5 and heart)
+    finally:
+        for client in (trainer, strap):
+            client.stop()
+        for client in (trainer, strap):
+            client.join()
+
+    assert all(195 <= x.power <= 205 for x in cycling[count + 1:])
+    assert all(x.cadence >= 80 for x in cycling[count + 1:])
+    # la FC vient du simulateur de l'appareil (80 au départ)
+    assert all(70 <= x.bpm <= 190 for x in heart)
+
+
+def test_out_of_range_target_is_refused_before_writing():
+    device = FakeDevice(power_range=(0, 500, 1), seed=0)
+    trainer = create_fake_clients(device, period=0.02)[0]
+    trainer.scheduler.min_interval = 0
+    trainer.run_thread()
+    try:
+        assert trainer.wait_for_connection(5)
+        trainer.set_power(1000)
+        _wait(lambda: trainer.scheduler.failed)
+    finally:
+        trainer.stop()
+        trainer.join()
+    assert device.target_power == 0
+
+
+def test_packet_loss_is_counted():
+    driver = FakeBleakClient(period=0.01, loss=0.5, seed=3)
+    lost = [driver._lost() for _ in range(1000)]
+    assert driver.lost == sum(lost)
+    assert 400 < driver.lost < 600
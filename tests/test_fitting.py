@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from bles.core.simulator.base_simulator import GPTPowerSimulator, PowerSimulator
+from bles.core.simulator.fitting import (DEFAULT_SPACES, Fitter, Profile, default_params, load_profile,
+                                         load_sessions, session_error)
+from tests import TEST_DATA
+
+
+@pytest.fixture(scope="module")
+def sessions():
+    return load_sessions(TEST_DATA)
+
+
+def _mae(simulator, params, sessions):
+    return np.mean([session_error(simulator, params, s) for s in sessions])
+
+
+@pytest.mark.parametrize("cls", [PowerSimulator, GPTPowerSimulator])
+def test_default_params_are_constructor_defaults(cls):
+    params = default_params(cls.__name__, DEFAULT_SPACES[cls.__name__])
+    simu = cls()
+    for k, v in params.items():
+        assert getattr(simu, k) == v
+
+
+def test_small_budget_is_never_worse_than_defaults(sessions, capsys):
+    simulator = "GPTPowerSimulator"
+    defaults = _mae(simulator, default_params(simulator, DEFAULT_SPACES[simulator]), sessions)
+    calls = []
+    profile = Fitter(sessions, simulator, workers=1, seed=0).fit(
+        4, 2, progress=lambda *args: calls.append(args))
+    assert profile.mae <= defaults
+    assert profile.mae == pytest.approx(_mae(simulator, profile.params, sessions))
+    assert [x[:2] for x in calls] == [(1, 2), (2, 2)]
+    # la progression passe par le callback, la bibliothèque n'écrit rien
+    assert capsys.readouterr().out == ""
+
+
+def test_profile_round_trip(tmp_path, sessions):
+    profile = Profile("GPTPowerSimulator", {"min_freq": 60, "max_freq": 190, "pma": 250, "init_freq": None,
+                                            "tau_rest": 40, "tau_peak": 4}, 3.2, [s.name for s in sessions], "bob")
+    file = tmp_path / "bob.json"
+    profile.save(file)
+    loaded = Profile.load(file)
+    assert loaded.to_json() == profile.to_json()
+    simu = load_profile(file, init_freq=90)
+    assert isinstance(simu, GPTPowerSimulator)
+    assert (simu.pma, simu.tau_rest, simu.init_freq) == (250, 40, 90)
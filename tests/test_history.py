@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from bles.core.simulator.history import RingBuffer
+
+
+def test_wraparound_keeps_last_values_in_order():
+    buf = RingBuffer(4)
+    for x in range(10):
+        buf.append(x)
+    assert len(buf) == 4
+    assert buf.total == 10
+    assert list(buf) == [6, 7, 8, 9]
+    assert list(buf.tail(2)) == [8, 9]
+    assert list(buf.tail(10)) == [6, 7, 8, 9]
+    assert buf[-1] == 9
+
+
+def test_tail_is_a_view():
+    buf = RingBuffer(4)
+    buf.extend(range(7))
+    assert np.shares_memory(buf.tail(), buf._data)
+
+
+@pytest.mark.parametrize("chunks", [[10], [3, 3, 4], [1] * 10, [5, 0, 5]])
+def test_extend_matches_append(chunks):
+    a, b = RingBuffer(4), RingBuffer(4)
+    values = list(range(sum(chunks)))
+    for x in values:
+        a.append(x)
+    start = 0
+    for n in chunks:
+        b.extend(values[start:start + n])
+        start += n
+    assert list(b) == list(a)
+    assert b.total == a.total
+
+
+@pytest.mark.parametrize("chunks", [[10], [3, 3, 4], [1] * 10, [6, 4]])
+def test_spill_receives_every_value_once(chunks):
+    spilled = []
+    buf = RingBuffer(4, spill=lambda v: spilled.extend(v.tolist()))
+    start = 0
+    for n in chunks:
+        buf.extend(range(start, start + n))
+        start += n
+    assert list(buf) == [6, 7, 8, 9]
+    buf.flush()
+    assert spilled == list(range(10))
+    buf.flush()
+    assert spilled == list(range(10))
+
+
+def test_spill_on_append_and_clear():
+    spilled = []
+    buf = RingBuffer(3, spill=lambda v: spilled.append(v.tolist()))
+    for x in range(7):
+        buf.append(x)
+    assert spilled == [[0, 1, 2], [3, 4, 5]]
+    buf.clear()
+    assert spilled == [[0, 1, 2], [3, 4, 5], [6]]
+    assert len(buf) == 0 and not buf
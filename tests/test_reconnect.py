@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from bles.core.ble.base import ReconnectPolicy
+from bles.core.ble.fake import FakeBleakClient
+from bles.core.ble.heart import HeartClient
+
+
+def test_backoff_is_exponential_and_capped():
+    policy = ReconnectPolicy(initial=1, maximum=10, factor=2, jitter=0)
+    assert [policy.delay(i) for i in range(6)] == [1, 2, 4, 8, 10, 10]
+
+
+def test_backoff_gives_up_after_max_attempts():
+    policy = ReconnectPolicy(jitter=0, max_attempts=2)
+    assert policy.delay(1) is not None
+    assert policy.delay(2) is None
+
+
+@pytest.mark.parametrize("attempt", [0, 3, 10])
+def test_backoff_jitter_only_shortens(attempt):
+    policy = ReconnectPolicy(initial=1, maximum=30, jitter=0.5)
+    full = min(30, 2 ** attempt)
+    for _ in range(50):
+        assert full * 0.5 <= policy.delay(attempt) <= full
+
+
+def _wait(predicate, timeout=5):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "délai dépassé"
+        time.sleep(0.01)
+
+
+def test_gap_marks_first_sample_after_reconnection():
+    driver = FakeBleakClient(services=("hrs",), period=0.05)
+    client = HeartClient(driver, reconnect=ReconnectPolicy(initial=0.2, jitter=0))
+    samples = []
+    client.add_handler(lambda feature, data: samples.append(data))
+    client.run_thread()
+    try:
+        assert client.wait_for_connection(5)
+        _wait(lambda: len(samples) >= 3)
+        client._loop.call_soon_threadsafe(driver.drop)
+        _wait(lambda: client.reconnections and client.is_connected and any(x.gap for x in samples))
+        _wait(lambda: samples[-1].gap == 0)
+    finally:
+        client.stop()
+        client.join()
+
+    gaps = [x.gap for x in samples if x.gap]
+    assert len(gaps) == 1
+    # au moins le délai de reconnexion sans données
+    assert gaps[0] >= 0.2
+    assert client.reconnections == 1
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from bles.core.ble import features
+from bles.core.ble.fake import FTMS_CONTROL_POINT, FTMS_FEATURE, FTMS_INDOOR_BIKE_DATA, FakeBleakClient
+from bles.core.ble.fitness import FitnessClient
+from bles.core.ble.record import NOTIFY, READ, WRITE, LogWriter, ReplayBleakClient, read_log, replay
+
+
+def test_log_round_trip(tmp_path):
+    path = tmp_path / "log.bin"
+    log = LogWriter(path, address="AA", feature="cycling")
+    log.write(READ, FTMS_FEATURE, b"\x01\x02")
+    log.write(NOTIFY, FTMS_INDOOR_BIKE_DATA, bytearray(b"abc"))
+    log.write(WRITE, FTMS_CONTROL_POINT, b"")
+    log.write(NOTIFY, FTMS_INDOOR_BIKE_DATA, b"def")
+    log.close()
+    # écriture après fermeture ignorée
+    log.write(NOTIFY, FTMS_INDOOR_BIKE_DATA, b"ghi")
+
+    header, records = read_log(path)
+    assert header["address"] == "AA" and header["feature"] == "cycling"
+    assert [(kind, uuid, data) for kind, uuid, t, data in records] == [
+        (READ, FTMS_FEATURE, b"\x01\x02"),
+        (NOTIFY, FTMS_INDOOR_BIKE_DATA, b"abc"),
+        (WRITE, FTMS_CONTROL_POINT, b""),
+        (NOTIFY, FTMS_INDOOR_BIKE_DATA, b"def"),
+    ]
+    times = [t for kind, uuid, t, data in records]
+    assert times == sorted(times)
+
+
+def test_read_log_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a log")
+    with pytest.raises(ValueError):
+        read_log(path)
+
+
+def _record_fake_session(path, duration=0.5):
+    driver = FakeBleakClient(services=("ftms",), period=0.02, seed=1)
+    client = FitnessClient(driver, min_write_interval=0, record=path)
+    samples = []
+    client.add_handler(lambda feature, data: samples.append(data))
+    client.run_thread()
+    try:
+        assert client.wait_for_connection(5)
+        client.set_power(180)
+        time.sleep(duration)
+    finally:
+        client.stop()
+        client.join()
+    return samples
+
+
+def test_record_then_replay_fake_backend(tmp_path):
+    path = tmp_path / "fake.bin"
+    samples = _record_fake_session(path)
+
+    header, records = read_log(path)
+    assert header["feature"] == features.cycling
+    kinds = {(kind, uuid) for kind, uuid, t, data in records}
+    assert (READ, FTMS_FEATURE) in kinds
+    assert (WRITE, FTMS_CONTROL_POINT) in kinds
+    notifications = [data for kind, uuid, t, data in records if kind == NOTIFY and uuid == FTMS_INDOOR_BIKE_DATA]
+    assert len(notifications) >= len(samples) > 0
+
+    count, duration = replay(path)
+    assert count == len(notifications)
+
+    # le rejeu redonne les mêmes mesures
+    driver = ReplayBleakClient(path, speed=None)
+    client = FitnessClient(driver)
+    replayed = []
+    client.add_handler(lambda feature, data: replayed.append(data))
+    client.run_thread()
+    try:
+        assert client.wait_for_connection(5)
+        assert driver.finished.wait(5)
+    finally:
+        client.stop()
+        client.join()
+    assert [x.power for x in replayed[:len(samples)]] == [x.power for x in samples]
+
+
+def test_replay_with_missing_read_fails(tmp_path):
+    path = tmp_path / "incomplete.bin"
+    log = LogWriter(path, address="AA", feature=features.cycling)
+    log.write(NOTIFY, FTMS_INDOOR_BIKE_DATA, b"\x00" * 13)
+    log.close()
+    start = time.monotonic()
+    with pytest.raises(ValueError):
+        replay(path, timeout=2)
+    assert time.monotonic() - start < 5
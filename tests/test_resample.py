@@ -0,0 +1,37 @@
+from bles.app.stats.base import Point
+from bles.core.ble.fitness import CyclingData
+from bles.core.ble.heart import HRSState
+from bles.core.sequencer.resample import Resampler, has_samples
+
+
+def test_empty_point_is_not_recorded():
+    resampler = Resampler(period=1)
+    resampler.start(now=100)
+    point = resampler.sample_at(0)
+    assert not has_samples(point)
+    p = Point.new(point)
+    assert p.power is None and p.bpm is None
+
+
+def test_stale_feature_is_none():
+    resampler = Resampler(period=1, max_age=2)
+    resampler.start(now=100)
+    resampler.push("cycling", CyclingData(power=150, monotonic=100.5))
+    resampler.push("heart_rate", HRSState(bpm=120, monotonic=104.5))
+    point = resampler.sample_at(5)
+    assert point["stale"] == ["cycling"]
+    assert has_samples(point)
+    p = Point.new(point)
+    assert p.power is None
+    assert p.bpm == 120
+
+
+def test_timestamp_is_absolute():
+    resampler = Resampler(period=0.5)
+    resampler.start(now=100, start_time=1_700_000_000)
+    resampler.push("cycling", CyclingData(power=150, monotonic=100.2))
+    point = resampler.sample_at(4)
+    assert point["index"] == 4
+    assert point["timestamp"] == 1_700_000_002
+    assert point["cycling"].timestamp == 1_700_000_002
+    assert Point.new(point).timestamp == 1_700_000_002
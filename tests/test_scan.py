@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from bleak.backends.device import BLEDevice
+
+from bles.core.ble.scan import DeviceCache, DeviceDiscovery
+
+TRAINER = "AA:00:00:00:00:01"
+STRAP = "AA:00:00:00:00:02"
+
+
+def _advertisement(name, rssi=-60):
+    return SimpleNamespace(local_name=name, rssi=rssi, manufacturer_data={})
+
+
+class FakeScanner:
+    """Annonce chaque appareil toutes les `period` secondes jusqu'à stop()"""
+
+    def __init__(self, callback, devices, period=0.01):
+        self.callback = callback
+        self.devices = devices
+        self.period = period
+        self.running = False
+        self._task = None
+
+    async def start(self):
+        self.running = True
+        self._task = asyncio.create_task(self._advertise())
+
+    async def stop(self):
+        self.running = False
+        self._task.cancel()
+
+    async def _advertise(self):
+        while True:
+            for address, delay in self.devices.items():
+                if delay <= 0:
+                    self.callback(BLEDevice(address, address, None), _advertisement(address))
+            self.devices = {k: v - self.period for k, v in self.devices.items()}
+            await asyncio.sleep(self.period)
+
+
+class FakeDiscovery(DeviceDiscovery):
+
+    def __init__(self, cache, devices):
+        super().__init__(cache)
+        self.devices = devices
+        self.scanners = []
+
+    async def _scanner(self):
+        scanner = FakeScanner(self._on_detection, dict(self.devices))
+        await scanner.start()
+        self.scanners.append(scanner)
+        return scanner
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DeviceCache(tmp_path / "devices.json")
+
+
+def test_scan_stops_once_wanted_devices_are_seen(cache):
+    # le cardio n'apparaît qu'après 0.1s, le scan dure au plus 5s
+    discovery = FakeDiscovery(cache, {TRAINER: 0, STRAP: 0.1})
+    start = time.monotonic()
+    data = discovery.scan_sync(5, [TRAINER.lower(), STRAP])
+    assert time.monotonic() - start < 2
+    assert set(data) == {TRAINER, STRAP}
+    assert not discovery.scanners[0].running
+    assert isinstance(discovery.find(TRAINER), BLEDevice)
+
+
+def test_cache_keeps_rssi_history_and_persists(cache):
+    device = BLEDevice(TRAINER, "trainer", None)
+    for rssi in range(-70, -40):
+        cache.update(device, _advertisement("trainer", rssi))
+    cache.save()
+
+    entry = json.loads(cache.file.read_text())[TRAINER]
+    assert entry["rssi"] == -41
+    assert len(entry["rssi_history"]) == cache.history
+    assert entry["rssi_history"][-1][1] == -41
+
+
+def test_persisted_cache_skips_scan_on_next_start(cache):
+    cache.update(BLEDevice(TRAINER, "trainer", None), _advertisement("trainer"))
+    cache.save()
+    reloaded = DeviceCache(cache.file)
+    # exécution précédente : seule l'adresse est connue, elle suffit à BleakClient
+    assert reloaded.find(TRAINER) == TRAINER
+    assert reloaded.find(STRAP) is None
+
+    entry = reloaded.devices[TRAINER]
+    entry["last_seen"] -= 60
+    assert reloaded.find(TRAINER, max_age=30) is None
+
+
+def test_background_scan_feeds_cache_and_pauses(cache):
+    discovery = FakeDiscovery(cache, {TRAINER: 0})
+    discovery.start_background()
+    try:
+        deadline = time.monotonic() + 2
+        while discovery.find(TRAINER) is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        # le scan à la demande écoute le scan continu sans démarrer de scanner
+        assert set(discovery.scan_sync(1, [TRAINER])) == {TRAINER}
+        assert len(discovery.scanners) == 1
+
+        with discovery.paused():
+            assert not discovery.scanners[0].running
+        assert discovery.scanners[-1].running
+        assert len(discovery.scanners) == 2
+    finally:
+        discovery.stop_background()
+    time.sleep(0.1)
+    assert not discovery.scanners[-1].running
+    assert TRAINER in json.loads(cache.file.read_text())
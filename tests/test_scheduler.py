@@ -0,0 +1,39 @@
+from bles.core.ble.base import CommandScheduler, Message
+from bles.core.ble.fitness import SetPower, SetResistance, SetSimulationParam
+
+
+class Other(Message):
+    _name_ = "other"
+
+
+def _drain(scheduler):
+    ret = []
+    while len(scheduler):
+        ret.append(scheduler.pop())
+    return ret
+
+
+def test_latest_target_mode_wins():
+    scheduler = CommandScheduler()
+    scheduler.push(SetPower(150))
+    scheduler.push(SetResistance(30))
+    scheduler.push(SetPower(200))
+    sent = _drain(scheduler)
+    assert [(type(x), x.value) for x in sent] == [(SetPower, 200)]
+    assert scheduler.dropped == 2
+
+
+def test_replaced_command_moves_to_the_end():
+    scheduler = CommandScheduler()
+    scheduler.push(SetSimulationParam((0, 1, 0.004, 0.5)))
+    scheduler.push(Other())
+    scheduler.push(SetPower(200))
+    assert [type(x) for x in _drain(scheduler)] == [Other, SetPower]
+
+
+def test_restore_reapplies_latest_target_last():
+    scheduler = CommandScheduler()
+    for message in (SetPower(150), Other(), SetResistance(30), SetPower(200)):
+        scheduler.done(message)
+    scheduler.restore()
+    assert [(type(x), getattr(x, "value", None)) for x in _drain(scheduler)] == [(Other, None), (SetPower, 200)]
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+from bleak.exc import BleakError
+
+from bles.common.config import DEFAULT_RIDER, SequencerConfig
+from bles.core.ble import features
+from bles.core.ble.base import ReconnectPolicy
+from bles.core.ble.fake import FakeBleakClient, FakeDevice
+from bles.core.sequencer.base import ControllableSequencer
+
+TRAINER = "FA:KE:00:00:00:01"
+STRAP = "FA:KE:00:00:00:02"
+
+
+class OutOfRange(FakeBleakClient):
+    """Appareil configuré mais absent : toutes les connexions échouent"""
+    attempts = 0
+
+    async def __aenter__(self):
+        self.attempts += 1
+        raise BleakError(f"{self.address} introuvable")
+
+
+class FakeSequencer(ControllableSequencer):
+    """Les appareils sont des FakeBleakClient au lieu de résultats de scan"""
+
+    def __init__(self, config, drivers):
+        super().__init__(config)
+        self.drivers = drivers
+
+    def _discover_devices(self):
+        return dict(self.drivers)
+
+
+def _config(strap_required, strap_timeout):
+    config = SequencerConfig()
+    config.resample = None
+    config.add_device("trainer", TRAINER)
+    config.add_device("strap", STRAP)
+    config.add_ble_client("trainer", features.cycling, timeout=5)
+    # tentatives rapprochées : une reconnexion après l'abandon se verrait tout de suite
+    config.add_ble_client("strap", features.heart_rate, required=strap_required, timeout=strap_timeout,
+                          reconnect=ReconnectPolicy(initial=0.05, maximum=0.05))
+    return config
+
+
+def _drivers():
+    device = FakeDevice(seed=0)
+    return {
+        TRAINER: FakeBleakClient(device, TRAINER, services=("ftms",), period=0.05),
+        STRAP: OutOfRange(device, STRAP, services=("hrs",)),
+    }
+
+
+def test_missing_optional_device_is_tolerated():
+    drivers = _drivers()
+    sequencer = FakeSequencer(_config(strap_required=False, strap_timeout=0.5), drivers)
+    try:
+        sequencer._connect_devices()
+        # le client abandonné ne tente plus de se reconnecter
+        attempts = drivers[STRAP].attempts
+        time.sleep(0.5)
+        assert drivers[STRAP].attempts == attempts
+        assert list(sequencer._ble_clients) == [features.cycling]
+        assert features.heart_rate not in sequencer.riders[DEFAULT_RIDER].ble_clients
+        devices = sequencer.connection["devices"]
+        assert devices[features.cycling]["connected"]
+        assert not devices[features.heart_rate]["connected"]
+        assert not devices[features.heart_rate]["required"]
+    finally:
+        sequencer.stop()
+
+
+def test_missing_required_device_fails_the_start():
+    sequencer = FakeSequencer(_config(strap_required=True, strap_timeout=0.5), _drivers())
+    try:
+        with pytest.raises(TimeoutError, match=features.heart_rate):
+            sequencer._connect_devices()
+        assert sequencer._ble_clients == {}
+    finally:
+        sequencer.stop()
+
+
+def test_explicit_zero_timeout_is_not_the_default():
+    sequencer = FakeSequencer(_config(strap_required=False, strap_timeout=0), _drivers())
+    start = time.monotonic()
+    try:
+        sequencer._connect_devices()
+    finally:
+        sequencer.stop()
+    # le délai par défaut est de 30s
+    assert time.monotonic() - start < 10
+    assert not sequencer.connection["devices"][features.heart_rate]["connected"]
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import pytest
+
+from bles.core.ble.session import SessionReader
+
+ELITE = Path(__file__).parent / "data" / "orca_share_media1747157600814_7328110113726402076.csv"
+
+
+@pytest.fixture
+def stat_file(tmp_path):
+    path = tmp_path / "stat.csv"
+    lines = ["timestamp;bpm;power"]
+    lines += [f"{i * 0.5};{100 + i % 50};{i}" for i in range(40)]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def _expected(rows, timestamp):
+    return [x for x in rows if x["timestamp"] >= timestamp]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 7, 40, 1024])
+@pytest.mark.parametrize("timestamp", [-1, 0, 0.5, 1.75, 2, 3.5, 12, 19.5, 19.6, 100])
+def test_seek_stat(stat_file, chunk_size, timestamp):
+    rows = list(SessionReader(stat_file))
+    reader = SessionReader(stat_file, chunk_size=chunk_size)
+    reader.seek(timestamp)
+    assert list(reader) == _expected(rows, timestamp)
+    chunks = list(reader.chunks())
+    assert all(0 < len(x) <= chunk_size for x in chunks)
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1024])
+def test_seek_at_chunk_boundaries(stat_file, chunk_size):
+    rows = list(SessionReader(stat_file))
+    reader = SessionReader(stat_file, chunk_size=chunk_size)
+    # premier et dernier élément de chaque paquet
+    for i in sorted({*range(0, len(rows), chunk_size), *range(chunk_size - 1, len(rows), chunk_size)}):
+        reader.seek(rows[i]["timestamp"])
+        assert next(iter(reader)) == rows[i]
+        assert len(list(reader)) == len(rows) - i
+
+
+def test_seek_elite():
+    rows = list(SessionReader(ELITE))
+    reader = SessionReader(ELITE, chunk_size=100)
+    for i in (0, 1, 99, 100, 101, len(rows) - 1):
+        reader.seek(rows[i]["timestamp"])
+        assert list(reader) == rows[i:]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from bles.common.csv_elite import read_csv_elite
+from bles.core.simulator.base_simulator import PowerSimulator, GPTPowerSimulator
+from tests import TEST_DATA
+
+
+def _same(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return np.array_equal(a, b) if isinstance(a, np.ndarray) else a == b
+
+
+@pytest.mark.parametrize("cls", [PowerSimulator, GPTPowerSimulator])
+def test_predict_leaves_simulator_unchanged(cls):
+    simu = cls()
+    before = simu.snapshot()
+    simu.predict([[150] * 5, [200] * 5])
+    assert _same(simu.snapshot(), before)
+    assert simu.init_freq is None
+
+
+def test_gpt_predict_starts_from_default_bpm():
+    simu = GPTPowerSimulator()
+    ret = simu.predict([(150, 5)])
+    assert ret[0, 0] == 100
+    simu.step(150)
+    assert simu.last_bpm == 100
+
+
+def test_compiled_zone_matches_typed_model():
+    from bles.core.simulator.zone_simulator import ZoneAerobie, CompiledZone, power_curve
+
+    curve = power_curve((200, 120), (100, 60), (300, 120), (50, 60))
+    zone = ZoneAerobie(200, 33)
+    generic = CompiledZone.simulate(zone.compile(), curve)
+    fast = zone.compile().simulate(curve)
+    for x, y in zip(generic, fast):
+        assert np.array_equal(x, y)
+    # check=True rejoue chaque pas avec le modèle typé
+    zone.compile(check=True).simulate(curve)
+
+
+def test_power_curve():
+    from bles.core.simulator.zone_simulator import power_curve
+
+    assert list(power_curve((200, 2), (100, 1))) == [200, 200, 100]
+    assert len(power_curve()) == 0
+    assert len(power_curve((200, 0))) == 0
+
+
+def _power_series(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 400, n)
+
+
+def test_gpt_step_matches_reference():
+    # même séance que get_values() : le pas à pas doit être identique au bit près
+    csv = read_csv_elite(TEST_DATA / "orca_share_media1747157600814_7328110113726402076.csv")
+    power = np.array([x["power"] for x in csv], dtype=int)
+    simu = GPTPowerSimulator(init_freq=csv[0]["heartrate"])
+    bpms = [simu.step(x) for x in power]
+    np.testing.assert_array_equal(bpms, simu.simulate_dynamic_heart_rate(power))
+
+
+@pytest.mark.parametrize("cls", [PowerSimulator, GPTPowerSimulator])
+def test_simulate_matches_step(cls):
+    power = _power_series()
+    stepped, batch = cls(init_freq=90), cls(init_freq=90)
+    bpms = [stepped.step(x) for x in power]
+    result = batch.simulate(power)
+    np.testing.assert_allclose(result.bpm, bpms)
+    np.testing.assert_allclose(batch._effective_power.tail(), stepped._effective_power.tail())
+    assert batch.time == stepped.time
+    assert _same(batch.snapshot()["zones"], stepped.snapshot()["zones"])
+
+
+@pytest.mark.parametrize("cls", [PowerSimulator, GPTPowerSimulator])
+def test_simulate_then_step_continues(cls):
+    power = _power_series()
+    stepped, mixed = cls(init_freq=90), cls(init_freq=90)
+    bpms = [stepped.step(x) for x in power]
+    head = list(mixed.simulate(power[:300]).bpm)
+    tail = [mixed.step(x) for x in power[300:450]]
+    rest = list(mixed.simulate(power[450:]).bpm)
+    np.testing.assert_allclose(head + tail + rest, bpms)